@@ -0,0 +1,476 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PySide6 import __version__ as pyside_version
+from PySide6.QtCore import QEvent, QPoint, QPointF, QSize, Qt
+from PySide6.QtGui import QColor, QImage, QMouseEvent, QPainter, QWheelEvent
+from PySide6.QtWidgets import QApplication
+
+import final
+from chart import PlotCanvas
+from data_series import open_series, LOD_SUFFIX
+from expr_cache import ExpressionCache
+from fast_expr import compile_expression
+from sampling import adaptive_sample, scalar_evaluator
+
+# expression, (x_start, x_end), step
+CASES = [
+    ("sin(x)", (-10, 10), 0.01),
+    ("sin(x)*x", (-1000, 1000), 0.001),
+    ("tan(x)", (-20, 20), 0.01),
+    ("exp(-x^2/50)*cos(5*x)", (-100, 100), 0.01),
+]
+SIZES = [(800, 600), (1600, 1000)]
+CANVAS_FUNCS = {"sin(x)": math.sin, "x^2": lambda x: 0.05 * x ** 2}
+CANVAS_ZOOMS = [1.0, 5.0]
+
+DATA_SAMPLES = 1 << 24  # float32 samples of the generated data series
+
+PAN_FRAMES = 20
+PAN_STEP = 15  # pixels the view moves per pan frame
+ZOOM_FRAMES = 10  # wheel steps out, then the same number back in
+ROTATE_FRAMES = 20
+ROTATE_STEP = 3  # pixels the mouse moves per rotation frame
+GL_TOLERANCE = 64  # channel difference at which a pixel of an OpenGL canvas counts as different from QPainter's
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2  # relative slowdown reported as a regression
+
+# higher is better for rates, lower for times
+HIGHER_IS_BETTER = {'samples/s': True, 'ms': False, 'ms/frame': False, '%': False}
+
+
+def _timed(func, repeat):
+    # median wall time of `repeat` runs, in seconds
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def _metric(value, unit):
+    return {'value': value, 'unit': unit}
+
+
+def _settle(app, widget):
+    # waits until the background render jobs are done and their tiles are composited
+    widget.wait_for_render()
+    app.processEvents()
+
+
+def _send_mouse(widget, kind, pos, button):
+    buttons = Qt.NoButton if kind == QEvent.MouseButtonRelease else button
+    event = QMouseEvent(kind, QPointF(pos), QPointF(widget.mapToGlobal(pos)), button, buttons, Qt.NoModifier)
+    QApplication.sendEvent(widget, event)
+
+
+def _pan_frames(app, widget, button, frame):
+    # drags the view right and down by PAN_STEP per frame, returns the mean ms/frame
+    pos = QPoint(widget.width() // 2, widget.height() // 2)
+    _send_mouse(widget, QEvent.MouseButtonPress, pos, button)
+    started = time.perf_counter()
+    for _ in range(PAN_FRAMES):
+        pos += QPoint(PAN_STEP, PAN_STEP // 2)
+        _send_mouse(widget, QEvent.MouseMove, pos, button)
+        frame()
+    elapsed = time.perf_counter() - started
+    _send_mouse(widget, QEvent.MouseButtonRelease, pos, button)
+    return elapsed / PAN_FRAMES * 1000
+
+
+def _zoom_frames(app, widget, frame):
+    # zooms out and back in by ZOOM_FRAMES wheel steps around the widget center, returns the mean ms/frame
+    pos = QPointF(widget.width() / 2, widget.height() / 2)
+    started = time.perf_counter()
+    for delta in [-120] * ZOOM_FRAMES + [120] * ZOOM_FRAMES:
+        event = QWheelEvent(pos, widget.mapToGlobal(pos), QPoint(), QPoint(0, delta), Qt.NoButton, Qt.NoModifier,
+                            Qt.NoScrollPhase, False)
+        QApplication.sendEvent(widget, event)
+        frame()
+    return (time.perf_counter() - started) / (2 * ZOOM_FRAMES) * 1000
+
+
+def bench_final(app, text, x_range, step, size, repeat):
+    x_start, x_end = x_range
+    widget = final.ChartWidget()
+    widget.resize(*size)
+    widget.show()
+    app.processEvents()
+
+    cache = ExpressionCache()
+    func = cache.get(text, 'math')
+    func_vec = cache.get(text, 'numpy')
+    fallback = scalar_evaluator(func)
+
+    view = widget._view()
+    area = view.axis_area
+    view_left, _ = view.to_cartesian_coords(area.left(), 0)
+    view_right, _ = view.to_cartesian_coords(area.right() + 1, 0)
+    columns = area.width()
+    y_scale = (area.height() / 2) * view.scale / view.range_y
+
+    results = {}
+    results['compile'] = _metric(_timed(lambda: compile_expression(text, 'numpy'), repeat) * 1000, 'ms')
+
+    def sample():
+        return adaptive_sample(func_vec, x_start, x_end, step, view_left, view_right, columns, y_scale)
+
+    xs, ys = sample()
+    results['eval'] = _metric(len(xs) / _timed(sample, repeat), 'samples/s')
+
+    scalar_time = _timed(lambda: adaptive_sample(fallback, x_start, x_end, step, view_left, view_right,
+                                                 columns, y_scale), repeat)
+    results['eval_scalar'] = _metric(len(xs) / scalar_time, 'samples/s')
+
+    results['map'] = _metric(len(xs) / _timed(lambda: view.to_pyside_coords_array(xs, ys), repeat), 'samples/s')
+
+    px, py = view.to_pyside_coords_array(xs, ys)
+    image = QImage(QSize(*size), QImage.Format.Format_ARGB32_Premultiplied)
+
+    def paint():
+        image.fill(QColor(0, 0, 0, 0))
+        painter = QPainter(image)
+        painter.setClipRect(area)
+        final._draw_curve(painter, view, px, py)
+        painter.end()
+
+    results['paint'] = _metric(_timed(paint, repeat) * 1000, 'ms')
+
+    def plot():
+        widget.clear_canvas()
+        widget.draw_function(func_vec, x_start, x_end, step=step, fallback=fallback)
+        _settle(app, widget)
+
+    results['plot'] = _metric(_timed(plot, repeat) * 1000, 'ms/frame')
+    results['pan'] = _metric(_pan_frames(app, widget, Qt.LeftButton, lambda: _settle(app, widget)), 'ms/frame')
+    results['zoom'] = _metric(_zoom_frames(app, widget, lambda: _settle(app, widget)), 'ms/frame')
+
+    def plot_cones():
+        widget.clear_canvas()
+        widget.draw_function_cones(func, x_start, x_end, step=max(step, 0.1))
+        _settle(app, widget)
+
+    results['cones'] = _metric(_timed(plot_cones, repeat) * 1000, 'ms/frame')
+
+    widget.close()
+    return results
+
+
+def bench_plot_canvas(app, func, zoom, size, repeat):
+    canvas = PlotCanvas()
+    canvas.resize(*size)
+    canvas.func = func
+    canvas.zoom = zoom
+    image = QImage(QSize(*size), QImage.Format.Format_ARGB32_Premultiplied)
+
+    n = max(10, min(1000, int(20 * zoom)))
+    step = 20 / (n - 1)
+    results = {'eval': _metric(n / _timed(lambda: [func(-10 + i * step) for i in range(n)], repeat), 'samples/s')}
+
+    # the same stages paintEvent goes through per cone: value to pixels, then the cone itself
+    ys = [func(-10 + i * step) for i in range(n)]
+    spacing = zoom * (size[0] * 0.8 / 20) * (20 / n)
+    base_y = size[1] * 3 // 4
+
+    def map_cones():
+        return [(int(size[0] * 0.1 + i * spacing), y * zoom * 30) for i, y in enumerate(ys)]
+
+    results['map'] = _metric(n / _timed(map_cones, repeat), 'samples/s')
+    cones = map_cones()
+
+    def paint():
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        for px, height in cones:
+            canvas.draw_cone3d(painter, px, base_y, height, scale_y=1)
+        painter.end()
+
+    paint()  # fills the sprite cache like the first frame does
+    results['paint'] = _metric(_timed(paint, repeat) * 1000, 'ms')
+
+    canvas.render(image)  # the first frame builds the caches, it's measured by `frame` below anyway
+    results['frame'] = _metric(_timed(lambda: canvas.render(image), repeat) * 1000, 'ms/frame')
+    results['pan'] = _metric(_pan_frames(app, canvas, Qt.RightButton, lambda: canvas.render(image)), 'ms/frame')
+    return results
+
+
+def bench_main_cones(app, repeat):
+    try:
+        import main
+    except ImportError as ex:
+        print(f"Skipping main.MainWindow: {ex}")
+        return {}
+
+    from funcs import func_1
+    from matplotlib.backend_bases import MouseEvent
+
+    window = main.MainWindow()
+    window.resize(1200, 800)
+    window._create_figure()
+
+    def plot_series():
+        window.plot_area_1.clear()
+        window.plot_series(func_1, 0, 10, 2)
+        app.processEvents()  # the draw is queued in interactive mode
+
+    def plot_cone():
+        window.plot_area_1.clear()
+        window.plot_cone(window.plot_area_1, func_1(0.0), "blue", 1)
+        app.processEvents()
+
+    results = {'plot_series': _metric(_timed(plot_series, repeat) * 1000, 'ms'),
+               'plot_cone': _metric(_timed(plot_cone, repeat) * 1000, 'ms')}
+
+    # the stages of plot_series on their own: heights, the quads of the cones and a full draw of them
+    xs = 0 + 2 * np.arange(int((10 - 0) / 2))
+    results['eval'] = _metric(len(xs) / _timed(lambda: func_1(xs), repeat), 'samples/s')
+    heights = func_1(xs)
+    results['map'] = _metric(len(xs) / _timed(lambda: main._cone_quads(heights, np.arange(len(xs))), repeat),
+                             'samples/s')
+    plot_series()
+    results['paint'] = _metric(_timed(window.figure_canvas.draw, repeat) * 1000, 'ms')
+
+    # dragging the 3D axes, redrawn alone over the rest of the figure and then with full draws
+    canvas = window.figure_canvas
+    area = window.plot_area_1.bbox
+    x, y = area.x0 + area.width / 2, area.y0 + area.height / 2
+
+    def rotate():
+        MouseEvent('button_press_event', canvas, x, y, button=1)._process()
+        app.processEvents()
+        started = time.perf_counter()
+        for frame in range(1, ROTATE_FRAMES + 1):
+            MouseEvent('motion_notify_event', canvas, x + ROTATE_STEP * frame, y, button=1)._process()
+            app.processEvents()
+        elapsed = (time.perf_counter() - started) / ROTATE_FRAMES * 1000
+        MouseEvent('button_release_event', canvas, x + ROTATE_STEP * ROTATE_FRAMES, y, button=1)._process()
+        app.processEvents()
+        return elapsed
+
+    results['rotate_blit'] = _metric(rotate(), 'ms/frame')
+    window.toggle_interactive()
+    results['rotate_full'] = _metric(rotate(), 'ms/frame')
+    window.close()
+    return results
+
+
+def bench_data_series(app, size, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'series.npy')
+        ys = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(DATA_SAMPLES,))
+        ks = np.arange(DATA_SAMPLES)
+        ys[:] = np.sin(ks * 1e-5) + 0.1 * np.sin(ks * 0.37)
+        ys.flush()
+        del ys, ks
+
+        def build():
+            if os.path.exists(path + LOD_SUFFIX):
+                os.remove(path + LOD_SUFFIX)
+            return open_series(path)
+
+        results['lod_build'] = _metric(_timed(build, repeat) * 1000, 'ms')
+
+        widget = final.ChartWidget()
+        widget.resize(*size)
+        widget.show()
+        app.processEvents()
+
+        series = open_series(path)
+
+        def plot():
+            widget.clear_canvas()
+            widget.fit_view(*series.x_range(), *series.y_range())
+            widget.draw_data(series)
+            _settle(app, widget)
+
+        results['plot'] = _metric(_timed(plot, repeat) * 1000, 'ms/frame')
+        results['pan'] = _metric(_pan_frames(app, widget, Qt.LeftButton, lambda: _settle(app, widget)), 'ms/frame')
+        results['zoom'] = _metric(_zoom_frames(app, widget, lambda: _settle(app, widget)), 'ms/frame')
+
+        widget.close()
+        del series
+    return results
+
+
+def _pixels(image):
+    image = image.convertToFormat(QImage.Format.Format_RGB32)
+    rows = np.frombuffer(image.constBits(), dtype=np.uint8, count=image.sizeInBytes()).reshape(image.height(), -1)
+    return rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)[..., :3].astype(int)
+
+
+def _differing(painted, rendered):
+    # percentage of the pixels where the OpenGL canvas is off from the QPainter one by more than GL_TOLERANCE
+    return float((np.abs(_pixels(painted) - _pixels(rendered)).max(axis=-1) > GL_TOLERANCE).mean() * 100)
+
+
+def _dispose(app, *widgets):
+    # GL widgets are deleted here, on the GUI thread: collected from a render thread they abort
+    for widget in widgets:
+        widget.close()
+        widget.deleteLater()
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def bench_gl(app, size, repeat):
+    from gl_canvas import opengl_error
+
+    error = opengl_error()
+    if error is not None:
+        print(f"Skipping OpenGL canvas: {error}")
+        return {}
+
+    from chart import GLPlotCanvas
+
+    # final: the same curve and cones on both widgets, a GL frame includes reading the framebuffer back
+    widgets = []
+    for widget_class in (final.ChartWidget, final.GLChartWidget):
+        widget = widget_class()
+        widget.resize(*size)
+        widget.show()
+        app.processEvents()
+        widget.draw_function(lambda xs: 10 * np.sin(xs), -20, 20, step=0.01)
+        widget.draw_function_cones(math.cos, -10, 10, step=1.0)
+        app.processEvents()
+        widgets.append(widget)
+
+    painter_widget, gl_widget = widgets
+    results = {'final/differing': _metric(_differing(painter_widget.to_image(), gl_widget.to_image()), '%'),
+               'final/frame': _metric(_timed(gl_widget.to_image, repeat) * 1000, 'ms/frame'),
+               'final/pan': _metric(_pan_frames(app, gl_widget, Qt.LeftButton, gl_widget.to_image), 'ms/frame')}
+    _dispose(app, *widgets)
+
+    # chart: the cones of x^2 zoomed in
+    canvases = []
+    for canvas_class in (PlotCanvas, GLPlotCanvas):
+        canvas = canvas_class()
+        canvas.resize(*size)
+        canvas.show()
+        app.processEvents()
+        canvas.zoom = CANVAS_ZOOMS[-1]
+        canvas.set_function(CANVAS_FUNCS["x^2"])
+        app.processEvents()
+        canvases.append(canvas)
+
+    painter_canvas, gl_canvas = canvases
+    image = QImage(QSize(*size), QImage.Format.Format_ARGB32_Premultiplied)
+    painter_canvas.render(image)
+    grab = gl_canvas._layer.grabFramebuffer
+    results['chart/differing'] = _metric(_differing(image, grab()), '%')
+    results['chart/frame'] = _metric(_timed(grab, repeat) * 1000, 'ms/frame')
+    results['chart/pan'] = _metric(_pan_frames(app, gl_canvas, Qt.RightButton, grab), 'ms/frame')
+    _dispose(app, *canvases)
+    return results
+
+
+def run(app, repeat, engines):
+    results = {}
+
+    if 'final' in engines:
+        for text, x_range, step in CASES:
+            for size in SIZES:
+                prefix = f"final/{text}/{x_range[0]}..{x_range[1]}/{step}/{size[0]}x{size[1]}"
+                _report(results, prefix, bench_final(app, text, x_range, step, size, repeat))
+
+    if 'chart' in engines:
+        for name, func in CANVAS_FUNCS.items():
+            for zoom in CANVAS_ZOOMS:
+                for size in SIZES:
+                    prefix = f"chart/{name}/zoom={zoom}/{size[0]}x{size[1]}"
+                    _report(results, prefix, bench_plot_canvas(app, func, zoom, size, repeat))
+
+    if 'data' in engines:
+        for size in SIZES:
+            _report(results, f"data/{DATA_SAMPLES}/{size[0]}x{size[1]}", bench_data_series(app, size, repeat))
+
+    if 'main' in engines:
+        _report(results, "main/func_1/0..10/2", bench_main_cones(app, repeat))
+
+    if 'gl' in engines:
+        for size in SIZES:
+            _report(results, f"gl/{size[0]}x{size[1]}", bench_gl(app, size, repeat))
+
+    return results
+
+
+def _report(results, prefix, metrics):
+    for name, metric in metrics.items():
+        key = f"{prefix}/{name}"
+        results[key] = metric
+        print(f"{key:<70} {_format(metric)}")
+
+
+def _format(metric):
+    if metric['unit'] == 'samples/s':
+        return f"{metric['value']:>14,.0f} {metric['unit']}"
+    return f"{metric['value']:>14.2f} {metric['unit']}"
+
+
+def compare(results, baseline, threshold):
+    # returns lines describing metrics that got worse than the baseline by more than `threshold`
+    regressions = []
+    for key, metric in results.items():
+        base = baseline.get(key)
+        if base is None or base['unit'] != metric['unit'] or not base['value']:
+            continue
+
+        change = metric['value'] / base['value'] - 1
+        if HIGHER_IS_BETTER[metric['unit']]:
+            change = -change
+        if change > threshold:
+            regressions.append(f"{key}: {_format(base).strip()} -> {_format(metric).strip()} ({change:+.0%} worse)")
+    return regressions
+
+
+def _environment():
+    return {'python': platform.python_version(), 'pyside': pyside_version, 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'qpa': os.environ.get('QT_QPA_PLATFORM'), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the plotting widgets.")
+    parser.add_argument('--output', help="write the results to this json file")
+    parser.add_argument('--baseline', help="compare against results saved earlier with --output")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown that counts as a regression, default %(default)s")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="runs per measurement, the median is reported, default %(default)s")
+    parser.add_argument('--engines', nargs='+', choices=['final', 'chart', 'data', 'main', 'gl'],
+                        default=['final', 'chart', 'data', 'main', 'gl'])
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = run(app, max(1, args.repeat), args.engines)
+    final.parallel_eval.shutdown()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'environment': _environment(), 'results': results}, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+
+        regressions = compare(results, baseline['results'], args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regressions against {args.baseline} (threshold {args.threshold:.0%})")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
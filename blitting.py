@@ -0,0 +1,89 @@
+import time
+
+from instrumentation import tracer
+
+
+class BlitManager:
+    # draws a matplotlib figure over a cached copy of itself instead of from scratch. After every full
+    # draw the canvas without the animated artists is kept with copy_from_bbox. update() restores it,
+    # draws the animated artists and blits, draw_static() draws a new static artist over the last frame.
+    # Draws requested while artists are animated (a rotating 3D axes) become updates, full draws go
+    # through draw_idle so a burst of requests is one draw. Every frame is recorded in the tracer.
+
+    def __init__(self, canvas, on_frame=None):
+        self.canvas = canvas
+        self.on_frame = on_frame  # called after every frame, with the manager
+        self.artists = []
+
+        self._background = None
+        self._background_size = None
+        self._full_draw = canvas.draw
+        canvas.draw = self._draw
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add_artist(self, artist):
+        # the artist is left out of full draws and the background, and redrawn by every update
+        artist.set_animated(True)
+        self.artists.append(artist)
+        self._background = None
+
+    def remove_artist(self, artist):
+        artist.set_animated(False)
+        self.artists.remove(artist)
+        self._background = None
+
+    def invalidate(self):
+        self._background = None
+        self.canvas.draw_idle()
+
+    def update(self):
+        if not self._has_background():
+            self.canvas.draw_idle()
+            return
+
+        started = time.perf_counter()
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self._frame(started, False)
+
+    def draw_static(self, *artists):
+        # new artists that change nothing else, like a line that fits the current limits, are drawn on
+        # the last frame and become part of the background
+        if not self._has_background() or self.artists:
+            self.canvas.draw_idle()
+            return
+
+        started = time.perf_counter()
+        for artist in artists:
+            self.canvas.figure.draw_artist(artist)
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.canvas.blit(self.canvas.figure.bbox)
+        self._frame(started, False)
+
+    def _draw(self):
+        if self.artists and self._has_background():
+            self.update()
+            return
+
+        started = time.perf_counter()
+        self._full_draw()
+        self._frame(started, True)
+
+    def _on_draw(self, event):
+        # a full draw just finished: keep it as the background, then add the animated artists on top
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._background_size = self.canvas.get_width_height(physical=True)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def _has_background(self):
+        return self._background is not None and self._background_size == self.canvas.get_width_height(physical=True)
+
+    def _frame(self, started, is_full):
+        tracer.record_frame(started, time.perf_counter() - started, 'full' if is_full else 'blit')
+        if self.on_frame is not None:
+            self.on_frame(self)
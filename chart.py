@@ -1,8 +1,24 @@
 from PySide6.QtWidgets import QWidget
-from PySide6.QtGui import QPainter, QColor, QPen, QBrush, QPainterPath, QRadialGradient
-from PySide6.QtCore import Qt, QPoint
+from PySide6.QtGui import QPainter, QColor, QPen, QBrush, QPainterPath, QRadialGradient, QPixmap
+from PySide6.QtCore import Qt, QPoint, QRect
 
 import math
+import os
+
+import numpy as np
+
+from tile_cache import TileCache
+from view_transform import ViewTransform
+
+CONE_RADIUS_X = 14
+CONE_RADIUS_Y = 6
+SPRITE_HEIGHT_STEP = 0.5  # cone heights in pixels are rounded to this, so cones of similar height share a sprite
+SPRITE_MAX_HEIGHT = 4096  # taller cones are drawn directly instead of being cached
+SPRITE_PADDING = 2  # room for antialiased edges around the cone
+SPRITE_CACHE_BYTES = 32 * 1024 * 1024
+LABEL_MARGIN = 40  # pixels an x label may reach past its grid line
+BASE_N = 20  # cones at zoom 1
+CANVAS_ENV = 'PLOTTER_CANVAS'  # 'opengl' draws the plots with OpenGL, QPainter is the default and the fallback
 
 
 class PlotCanvas(QWidget):
@@ -14,9 +30,16 @@ class PlotCanvas(QWidget):
         self.offset_y = 0
         self.last_mouse_pos = None
 
+        self._sprites = TileCache(SPRITE_CACHE_BYTES)  # cone pixmaps by (height step, pixel ratio)
+
+        # grid and axes rendered at _grid_offset, valid while _grid_key (size, zoom, n) is unchanged
+        self._grid_layer = None
+        self._grid_key = None
+        self._grid_offset = (0, 0)
+
     def set_function(self, func):
         self.func = func
-        self.update()
+        self._redraw()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.RightButton:
@@ -28,7 +51,7 @@ class PlotCanvas(QWidget):
             self.offset_x += delta.x()
             self.offset_y += delta.y()
             self.last_mouse_pos = event.position().toPoint()
-            self.update()
+            self._redraw()
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -41,38 +64,75 @@ class PlotCanvas(QWidget):
         else:
             self.zoom /= 1.1
         self.zoom = max(0.2, min(5.0, self.zoom))  # Ограничения масштаба
-        self.update()
+        self._redraw()
 
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
-        painter.fillRect(self.rect(), QColor(255, 255, 255))
 
-        width = self.width()
-        height = self.height()
-        center_y = height * 3 // 4  # "земля", где стоят конусы
+        a, b, n, step, spacing, base_x, center_y, scale_y = self._layout()
+        self._draw_grid_layer(painter, a, b, n, center_y, scale_y)
+
+        for i in range(n):
+            x_val = a + i * step
+            y_val = self.func(x_val)
+
+            px = int(base_x + i * spacing * (BASE_N / n) + self.offset_x)
+            py_base = center_y + self.offset_y
+            self.draw_cone3d(painter, px, py_base, y_val, scale_y=scale_y)
+
+    def _layout(self):
+        # cone i stands at x = a + i * step, base_x + i * spacing * (BASE_N / n) pixels from the left
+        # before panning, and a unit of height is scale_y pixels
+        center_y = self.height() * 3 // 4  # "земля", где стоят конусы
 
         a, b = -10, 10
-        base_n = 20
-        n = int(base_n * self.zoom)
+        n = int(BASE_N * self.zoom)
         n = max(10, min(1000, n))  # ограничение
 
         step = (b - a) / (n - 1)
-        spacing = self.zoom * (self.width() * 0.8 / base_n)  # базовый spacing
+        spacing = self.zoom * (self.width() * 0.8 / BASE_N)  # базовый spacing
         base_x = self.width() * 0.1
         scale_y = self.zoom * 30
+        return a, b, n, step, spacing, base_x, center_y, scale_y
 
-        self.draw_grid_and_axes(painter, a, b, n, center_y, scale_y)
-
-        for i in range(n):
-            x_val = a + i * step
-            y_val = self.func(x_val)
+    def _redraw(self):
+        self.update()
 
-            px = int(base_x + i * spacing * (base_n / n) + self.offset_x)
-            py_base = center_y + self.offset_y
-            self.draw_cone3d(painter, px, py_base, y_val, scale_y=scale_y)
+    def _draw_grid_layer(self, painter, a, b, n, center_y, scale_y):
+        # panning only moves the grid, so the layer is scrolled by the change of the offset
+        # and just the uncovered strips are drawn again. Y labels stay at the left edge, they aren't in it
+        pixel_ratio = self.devicePixelRatioF()
+        key = (self.width(), self.height(), self.zoom, n, pixel_ratio)
+        dx = self.offset_x - self._grid_offset[0]
+        dy = self.offset_y - self._grid_offset[1]
+
+        if key != self._grid_key or abs(dx) >= self.width() or abs(dy) >= self.height():
+            self._grid_layer = QPixmap(round(self.width() * pixel_ratio), round(self.height() * pixel_ratio))
+            self._grid_layer.setDevicePixelRatio(pixel_ratio)
+            self._grid_key = key
+            exposed = [self.rect()]
+        else:
+            exposed = _scroll_layer(self._grid_layer, dx, dy, pixel_ratio)
+        self._grid_offset = (self.offset_x, self.offset_y)
+
+        if exposed:
+            layer_painter = QPainter(self._grid_layer)
+            layer_painter.setRenderHint(QPainter.Antialiasing)
+            for rect in exposed:
+                layer_painter.setClipRect(rect)
+                layer_painter.fillRect(rect, QColor(255, 255, 255))
+                self.draw_grid_and_axes(layer_painter, a, b, n, center_y, scale_y, rect=rect, y_labels=False)
+            layer_painter.end()
+
+        painter.drawPixmap(0, 0, self._grid_layer)
+        self.draw_y_labels(painter, center_y, scale_y)
+
+    def draw_grid_and_axes(self, painter, a, b, n, center_y, scale_y, rect=None, y_labels=True):
+        # only vertical lines and x labels that can reach into rect are drawn, by default the whole widget
+        if rect is None:
+            rect = self.rect()
 
-    def draw_grid_and_axes(self, painter, a, b, n, center_y, scale_y):
         # Параметры сетки
         grid_pen = QPen(QColor(200, 200, 200), 1, Qt.SolidLine)
         axis_pen = QPen(QColor(0, 0, 0), 2)
@@ -82,8 +142,15 @@ class PlotCanvas(QWidget):
         width = self.width()
         height = self.height()
 
+        # позиции вертикальных линий: left + i * spacing
+        left = self.width() * 0.1 + self.offset_x
+        spacing = self.zoom * (self.width() * 0.8 / n)
+        first = max(0, math.floor((rect.left() - LABEL_MARGIN - left) / spacing))
+        last = min(n - 1, math.ceil((rect.right() + LABEL_MARGIN - left) / spacing))
+        columns = range(first, last + 1)
+
         # Вертикальные линии (оси X)
-        for i in range(n):
+        for i in columns:
             x_pos = int(self.width() * 0.1 + i * self.zoom * (self.width() * 0.8 / n) + self.offset_x)
             painter.drawLine(x_pos, 0, x_pos, height)
 
@@ -110,12 +177,23 @@ class PlotCanvas(QWidget):
         painter.setFont(font)
 
         step = (b - a) / (n - 1)
-        for i in range(n):
+        for i in columns:
             x_val = a + i * step
             x_pos = int(self.width() * 0.1 + i * self.zoom * (self.width() * 0.8 / n) + self.offset_x)
             painter.drawText(x_pos - 15, center_y + 18 + self.offset_y, f"{x_val:.1f}")
 
+        if y_labels:
+            self.draw_y_labels(painter, center_y, scale_y)
+
+    def draw_y_labels(self, painter, center_y, scale_y):
+        painter.setPen(QPen(Qt.black))
+        font = painter.font()
+        font.setPointSize(8)
+        painter.setFont(font)
+
         # Подписи Y
+        y_range = 5
+        y_steps = 10
         for i in range(y_steps + 1):
             y_val = -y_range + i * (2 * y_range / y_steps)
             y_pos = int(center_y - y_val * scale_y + self.offset_y)
@@ -149,40 +227,152 @@ class PlotCanvas(QWidget):
 
     def draw_cone3d(self, painter, x: int, base_y: int, height: float, scale_y=30):
         cone_height = height * scale_y
-        top_y = base_y - cone_height
+        if not math.isfinite(cone_height):
+            return
+        if abs(cone_height) > SPRITE_MAX_HEIGHT:
+            _paint_cone3d(painter, x, base_y, cone_height)
+            return
+
+        # the cone only depends on its height in pixels, it's rendered once and then just blitted
+        steps = round(cone_height / SPRITE_HEIGHT_STEP)
+        sprite, anchor_x, anchor_y = self._cone_sprite(steps, painter.device().devicePixelRatio())
+        painter.drawPixmap(x - anchor_x, base_y - anchor_y, sprite)
+
+    def _cone_sprite(self, steps, pixel_ratio):
+        key = (steps, pixel_ratio)
+        cone_height = steps * SPRITE_HEIGHT_STEP
+        # the sprite covers the base ellipse and the tip, anchor is where the base center goes
+        anchor_x = CONE_RADIUS_X + SPRITE_PADDING
+        anchor_y = math.ceil(max(cone_height, CONE_RADIUS_Y)) + SPRITE_PADDING
+
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            width = 2 * anchor_x + 1
+            height = anchor_y + math.ceil(max(-cone_height, CONE_RADIUS_Y)) + SPRITE_PADDING + 1
+            sprite = QPixmap(round(width * pixel_ratio), round(height * pixel_ratio))
+            sprite.setDevicePixelRatio(pixel_ratio)
+            sprite.fill(Qt.transparent)
+
+            painter = QPainter(sprite)
+            painter.setRenderHint(QPainter.Antialiasing)
+            _paint_cone3d(painter, anchor_x, anchor_y, cone_height)
+            painter.end()
+            self._sprites.put(key, sprite)
+
+        return sprite, anchor_x, anchor_y
+
+
+class GLPlotCanvas(PlotCanvas):
+    # PlotCanvas with its cones drawn by OpenGL (gl_canvas.GLPlotLayer) over the grid layer. The cones
+    # of a function, zoom and width are uploaded once as instances of one mesh, panning only moves them
 
-        base_radius_x = 14
-        base_radius_y = 6
+    def __init__(self, parent=None):
+        from gl_canvas import GLPlotLayer
 
-        # Основание (с тенью — radial gradient)
-        ellipse_gradient = QRadialGradient(x, base_y, base_radius_x)
-        ellipse_gradient.setColorAt(0.0, QColor(200, 200, 255))
-        ellipse_gradient.setColorAt(1.0, QColor(120, 120, 160))
-        painter.setBrush(ellipse_gradient)
-        painter.setPen(Qt.NoPen)
-        painter.drawEllipse(QPoint(x, base_y), base_radius_x, base_radius_y)
-
-        # Левая половина конуса — с изгибом внутрь
-        path_left = QPainterPath()
-        path_left.moveTo(x, top_y)
-        path_left.cubicTo(x - base_radius_x * 0.7, base_y - cone_height * 0.5,
-                          x - base_radius_x, base_y - cone_height * 0.2,
-                          x - base_radius_x, base_y)
-        path_left.lineTo(x, base_y)
-        path_left.closeSubpath()
-        painter.fillPath(path_left, QBrush(QColor(150, 180, 250)))
-
-        # Правая половина — чуть темнее, тоже изогнутая
-        path_right = QPainterPath()
-        path_right.moveTo(x, top_y)
-        path_right.cubicTo(x + base_radius_x * 0.7, base_y - cone_height * 0.5,
-                           x + base_radius_x, base_y - cone_height * 0.2,
-                           x + base_radius_x, base_y)
-        path_right.lineTo(x, base_y)
-        path_right.closeSubpath()
-        painter.fillPath(path_right, QBrush(QColor(80, 110, 180)))
-
-        # Контур — линия к вершине
-        painter.setPen(QPen(QColor(50, 50, 80), 1))
-        painter.drawLine(x - base_radius_x, base_y, x, top_y)
-        painter.drawLine(x + base_radius_x, base_y, x, top_y)
+        super().__init__(parent)
+        self._layer = GLPlotLayer(self, self._paint_under, lambda painter: None)
+        self._cones_key = None
+
+    def paintEvent(self, event):
+        # all of the widget is under the layer
+        pass
+
+    def resizeEvent(self, event):
+        self._layer.setGeometry(self.rect())
+        self._redraw()
+
+    def _redraw(self):
+        if self.width() <= 0 or self.height() <= 0:
+            return  # resizeEvent comes with the first size
+        a, b, n, step, spacing, base_x, center_y, scale_y = self._layout()
+        unit_x = spacing * (BASE_N / n) / step
+        # the same map as paintEvent: x = a lands on base_x, y = 0 on center_y
+        view = ViewTransform(self.rect(), base_x + self.offset_x - a * unit_x, center_y + self.offset_y, 1.0,
+                             self.width() / 2 / unit_x, self.height() / 2 / scale_y)
+
+        key = (self.func, n, unit_x, scale_y)
+        if key != self._cones_key:
+            xs = a + step * np.arange(n)
+            heights = np.array([self.func(x) for x in xs.tolist()], dtype=float)
+            finite = np.isfinite(heights)
+            self._layer.clear()
+            self._layer.add_cones(xs[finite], heights[finite], Qt.white, 2 * CONE_RADIUS_X / unit_x,
+                                  base_height=CONE_RADIUS_Y / scale_y, rounded=True)
+            self._cones_key = key
+        self._layer.set_view(view)
+
+    def _paint_under(self, painter):
+        a, b, n, step, spacing, base_x, center_y, scale_y = self._layout()
+        self._draw_grid_layer(painter, a, b, n, center_y, scale_y)
+
+
+def create_canvas(painter_class, opengl_class, parent=None):
+    # the canvas CANVAS_ENV asks for; without a usable OpenGL context the plots are drawn with QPainter
+    if os.environ.get(CANVAS_ENV, '').lower() == 'opengl':
+        from gl_canvas import opengl_error
+
+        error = opengl_error()
+        if error is None:
+            return opengl_class(parent)
+        print(f"OpenGL canvas unavailable, drawing with QPainter: {error}")
+    return painter_class(parent)
+
+
+def _paint_cone3d(painter, x, base_y, cone_height):
+    top_y = base_y - cone_height
+
+    base_radius_x = CONE_RADIUS_X
+    base_radius_y = CONE_RADIUS_Y
+
+    # Основание (с тенью — radial gradient)
+    ellipse_gradient = QRadialGradient(x, base_y, base_radius_x)
+    ellipse_gradient.setColorAt(0.0, QColor(200, 200, 255))
+    ellipse_gradient.setColorAt(1.0, QColor(120, 120, 160))
+    painter.setBrush(ellipse_gradient)
+    painter.setPen(Qt.NoPen)
+    painter.drawEllipse(QPoint(x, base_y), base_radius_x, base_radius_y)
+
+    # Левая половина конуса — с изгибом внутрь
+    path_left = QPainterPath()
+    path_left.moveTo(x, top_y)
+    path_left.cubicTo(x - base_radius_x * 0.7, base_y - cone_height * 0.5,
+                      x - base_radius_x, base_y - cone_height * 0.2,
+                      x - base_radius_x, base_y)
+    path_left.lineTo(x, base_y)
+    path_left.closeSubpath()
+    painter.fillPath(path_left, QBrush(QColor(150, 180, 250)))
+
+    # Правая половина — чуть темнее, тоже изогнутая
+    path_right = QPainterPath()
+    path_right.moveTo(x, top_y)
+    path_right.cubicTo(x + base_radius_x * 0.7, base_y - cone_height * 0.5,
+                       x + base_radius_x, base_y - cone_height * 0.2,
+                       x + base_radius_x, base_y)
+    path_right.lineTo(x, base_y)
+    path_right.closeSubpath()
+    painter.fillPath(path_right, QBrush(QColor(80, 110, 180)))
+
+    # Контур — линия к вершине
+    painter.setPen(QPen(QColor(50, 50, 80), 1))
+    painter.drawLine(x - base_radius_x, base_y, x, top_y)
+    painter.drawLine(x + base_radius_x, base_y, x, top_y)
+
+
+def _scroll_layer(layer, dx, dy, pixel_ratio):
+    # shifts the layer contents by (dx, dy) logical pixels, returns the uncovered strips
+    if not dx and not dy:
+        return []
+    layer.scroll(round(dx * pixel_ratio), round(dy * pixel_ratio), layer.rect())
+
+    width = round(layer.width() / pixel_ratio)
+    height = round(layer.height() / pixel_ratio)
+    exposed = []
+    if dx > 0:
+        exposed.append(QRect(0, 0, dx, height))
+    elif dx < 0:
+        exposed.append(QRect(width + dx, 0, -dx, height))
+    if dy > 0:
+        exposed.append(QRect(0, 0, width, dy))
+    elif dy < 0:
+        exposed.append(QRect(0, height + dy, width, -dy))
+    return exposed
@@ -0,0 +1,92 @@
+import numpy as np
+from PySide6.QtCore import QPoint
+from PySide6.QtGui import QBrush, QColor, QPen, Qt
+
+PIE_LEFT = (180 * 16, 90 * 16)  # from 180° to 270°
+PIE_RIGHT = (270 * 16, 90 * 16)  # from 270° to 360°
+BASE_RATIO = 0.1  # vertical radius of a cone's base ellipse per unit of its height
+
+
+def draw_cones(painter, color, top_x, top_y, left_x, right_x, base_y, radius_y):
+    # draws many cones at once, geometry in pixels with cones sorted by x. A cone is the outlined
+    # triangle top-left-right with a half ellipse at its base, dark on the left and light on the right,
+    # and a dark shadow triangle over its left half. A paint device with an add_cones(painter, color,
+    # geometry) method takes the cones over, vector exports write them as shared shapes.
+    if not len(top_x):
+        return
+
+    geometry = cone_geometry(top_x, top_y, left_x, right_x, base_y, radius_y)
+    add_cones = getattr(painter.device(), 'add_cones', None)
+    if add_cones is not None:
+        add_cones(painter, color, geometry)
+    else:
+        draw_cone_geometry(painter, color, geometry)
+
+
+def cone_geometry(top_x, top_y, left_x, right_x, base_y, radius_y):
+    # (top_x, top_y, left_x, right_x, base_y, radius_x, radius_y) as int arrays of one value per cone
+    num = len(top_x)
+    top_x = np.asarray(top_x).astype(int)
+    top_y = np.asarray(top_y).astype(int)
+    left_x = np.broadcast_to(left_x, num).astype(int)
+    right_x = np.broadcast_to(right_x, num).astype(int)
+    base_y = np.broadcast_to(base_y, num).astype(int)
+    radius_x = np.abs(left_x - right_x) // 2
+    radius_y = np.broadcast_to(radius_y, num).astype(int)
+    return top_x, top_y, left_x, right_x, base_y, radius_x, radius_y
+
+
+def cones_overlap(geometry):
+    _, _, left_x, right_x, _, _, _ = geometry
+    return not np.all(left_x[1:] >= right_x[:-1])
+
+
+def draw_cone_geometry(painter, color, geometry):
+    # pens and brushes are made once for all cones; when no two cones overlap the cones are drawn
+    # layer by layer, so each is also set only once
+    top_x, top_y, left_x, right_x, base_y, radius_x, radius_y = geometry
+
+    # QRect(left, top, width, height) of the ellipse around the base center
+    rects = np.column_stack((top_x - radius_x, base_y - radius_y, 2 * radius_x, 2 * radius_y)).tolist()
+    tops = [QPoint(x, y) for x, y in zip(top_x.tolist(), top_y.tolist())]
+    lefts = [QPoint(x, y) for x, y in zip(left_x.tolist(), base_y.tolist())]
+    rights = [QPoint(x, y) for x, y in zip(right_x.tolist(), base_y.tolist())]
+    shadows = [QPoint(x, y) for x, y in zip(top_x.tolist(), base_y.tolist())]
+
+    light = QBrush(color)
+    dark = QBrush(color.darker(150))
+    outline = QPen(QColor(0, 0, 0), 0.5)
+    no_pen = QPen(Qt.NoPen)
+
+    if not cones_overlap(geometry):
+        painter.setBrush(light)
+        painter.setPen(outline)
+        for top, left, right in zip(tops, lefts, rights):
+            painter.drawPolygon([top, left, right])
+
+        painter.setPen(no_pen)
+        painter.setBrush(dark)
+        for rect in rects:
+            painter.drawPie(*rect, *PIE_LEFT)
+        for top, left, shadow in zip(tops, lefts, shadows):
+            painter.drawPolygon([top, left, shadow])
+
+        painter.setBrush(light)
+        for rect in rects:
+            painter.drawPie(*rect, *PIE_RIGHT)
+        return
+
+    # overlapping cones cover each other, they have to be drawn one after another
+    for top, left, right, shadow, rect in zip(tops, lefts, rights, shadows, rects):
+        painter.setBrush(light)
+        painter.setPen(outline)
+        painter.drawPolygon([top, left, right])
+
+        painter.setPen(no_pen)
+        painter.setBrush(dark)
+        painter.drawPie(*rect, *PIE_LEFT)
+        painter.setBrush(light)
+        painter.drawPie(*rect, *PIE_RIGHT)
+
+        painter.setBrush(dark)
+        painter.drawPolygon([top, left, shadow])
@@ -0,0 +1,320 @@
+import math
+import os
+
+import numpy as np
+
+RAW_DTYPES = {'.f32': np.float32, '.f64': np.float64, '.bin': np.float64, '.dat': np.float64}
+POINTS_PER_COLUMN = 4  # raw samples drawn per pixel column, denser slices are reduced to min/max
+READ_CHUNK = 1 << 22  # samples reduced at a time, bounds the memory of a zoomed out view
+RANGE_PROBES = 4096  # samples read to estimate the y-range of a series without scanning it
+CSV_CHUNK_LINES = 1 << 16
+
+LOD_BASE_LEVEL = 6  # the finest pyramid level reduces 2**6 samples to their min and max
+LOD_MIN_SAMPLES = 1 << 20  # shorter series are scanned when drawn, they get no pyramid
+LOD_TOP_BUCKETS = 1024  # the coarsest level has at most this many buckets
+LOD_SUFFIX = '.lod.npy'
+
+
+class DataSeries:
+    # recorded samples backed by arrays that are usually np.memmap views of a file, only the pages of
+    # the visible slice are ever read. Without xs the samples are at x0 + i * dx; explicit xs must be
+    # sorted ascending.
+
+    def __init__(self, ys, xs=None, x0=0.0, dx=1.0, name='', lod=None):
+        self.ys = ys
+        self.xs = xs
+        self.x0 = x0
+        self.dx = dx
+        self.name = name
+        self.lod = lod  # LodPyramid of ys, used for the reduced levels it has
+
+    def __len__(self):
+        return len(self.ys)
+
+    def x_at(self, indices):
+        if self.xs is not None:
+            return np.asarray(self.xs[indices], dtype=float)
+        return self.x0 + np.asarray(indices, dtype=float) * self.dx
+
+    def x_range(self):
+        if not len(self):
+            return 0.0, 0.0
+        return float(self.x_at(0)), float(self.x_at(len(self) - 1))
+
+    def y_range(self):
+        # exact from the top pyramid level, otherwise estimated from evenly spaced samples
+        if not len(self):
+            return 0.0, 0.0
+        if self.lod is not None:
+            _, probe = self.lod.points(self.lod.top_level, 0, len(self))
+        else:
+            probe = np.asarray(self.ys[np.linspace(0, len(self) - 1, min(len(self), RANGE_PROBES)).astype(np.int64)],
+                               dtype=float)
+        probe = probe[np.isfinite(probe)]
+        if not len(probe):
+            return 0.0, 0.0
+        return float(probe.min()), float(probe.max())
+
+    def index_range(self, x_left, x_right):
+        # [first, last) of the samples inside [x_left, x_right] plus one on each side, so lines reach the border
+        if self.xs is not None:
+            first = int(np.searchsorted(self.xs, x_left, side='left')) - 1
+            last = int(np.searchsorted(self.xs, x_right, side='right')) + 1
+        else:
+            first = math.floor((x_left - self.x0) / self.dx)
+            last = math.ceil((x_right - self.x0) / self.dx) + 2
+        return max(0, first), min(len(self), last)
+
+    def lod_level(self, x_left, x_right, columns):
+        # 0 to draw the raw samples of [x_left, x_right] over `columns` pixel columns, otherwise the level
+        # whose buckets of 2**level samples give 2-4 points per column. Evenly spaced samples get the level
+        # from the scale alone, so every tile of a view is drawn at the same level.
+        if self.xs is None:
+            per_column = (x_right - x_left) / self.dx / max(1, columns)
+        else:
+            first, last = self.index_range(x_left, x_right)
+            per_column = (last - first) / max(1, columns)
+        if per_column <= POINTS_PER_COLUMN:
+            return 0
+        return int(math.log2(per_column))
+
+    def visible(self, x_left, x_right, level=0):
+        # samples covering [x_left, x_right] at a lod_level: the raw slice at level 0, otherwise the min and
+        # max of each bucket of 2**level samples. Buckets start at multiples of their size, so neighbouring
+        # ranges reduce the same way.
+        first, last = self.index_range(x_left, x_right)
+        if last <= first:
+            return np.empty(0), np.empty(0)
+        if not level:
+            return self.x_at(np.arange(first, last)), np.asarray(self.ys[first:last], dtype=float)
+
+        if self.lod is not None and level >= LOD_BASE_LEVEL:
+            indices, ys = self.lod.points(min(level, self.lod.top_level), first, last)
+            return self.x_at(indices), ys
+
+        bucket = 1 << level
+        first = first // bucket * bucket
+        last = min(len(self), -(-last // bucket) * bucket)
+        indices = []
+        # whole buckets per read, only the last bucket of the series may be shorter
+        chunk = max(1, READ_CHUNK // bucket) * bucket
+        for start in range(first, last, chunk):
+            indices.append(_min_max_indices(self.ys, start, min(start + chunk, last), bucket))
+        indices = np.concatenate(indices)
+        return self.x_at(indices), np.asarray(self.ys[indices], dtype=float)
+
+
+class LodPyramid:
+    # min/max pyramid of a series: level L has a row per bucket of 2**L samples, from LOD_BASE_LEVEL up to
+    # a level of at most LOD_TOP_BUCKETS buckets. A row is (index, y) of the bucket's min and max in index
+    # order, all levels are stacked in one (rows, 4) array that is usually mapped from a file.
+
+    def __init__(self, rows, num):
+        self.rows = rows
+        self.num = num
+        self.offsets = {}
+        self.counts = dict(_lod_levels(num))
+        offset = 0
+        for level, count in self.counts.items():
+            self.offsets[level] = offset
+            offset += count
+        self.top_level = max(self.counts)
+
+    def points(self, level, first, last):
+        # (indices, ys) of the min/max points of the buckets overlapping samples [first, last)
+        offset = self.offsets[level]
+        rows = np.asarray(self.rows[offset + (first >> level):offset + ((last - 1) >> level) + 1])
+        return rows[:, [0, 2]].ravel().astype(np.int64), rows[:, [1, 3]].ravel()
+
+
+def _min_max_indices(ys, start, end, bucket):
+    # indices of the min and the max of each bucket of ys[start:end], in index order
+    values = np.asarray(ys[start:end], dtype=float)
+    num_buckets = math.ceil(len(values) / bucket)
+    padded = np.full(num_buckets * bucket, np.nan)
+    padded[:len(values)] = values
+    padded = padded.reshape(num_buckets, bucket)
+
+    # all-nan buckets are a gap, they keep their first (nan) sample so the line breaks there
+    empty = np.isnan(padded).all(axis=1)
+    padded[empty] = 0
+    low = np.nanargmin(padded, axis=1)
+    high = np.nanargmax(padded, axis=1)
+
+    offsets = start + np.arange(num_buckets) * bucket
+    pair = np.sort(np.column_stack((offsets + low, offsets + high)), axis=1)
+    return np.minimum(pair.ravel(), end - 1)
+
+
+def open_series(path, dtype=None):
+    # .npy is mapped as it is, raw binary files by extension (RAW_DTYPES) or dtype, csv through a binary
+    # sidecar written next to it on first open. One column is y over the sample index, with two or more
+    # the first column is x and the second y. Long series get a LodPyramid, written next to the data
+    # on first open.
+    name = os.path.basename(path)
+    ext = os.path.splitext(path)[1].lower()
+    data_path = path
+    if ext == '.csv':
+        data_path = _csv_sidecar(path)
+        data = _load_npy(data_path)
+    elif ext == '.npy':
+        data = _load_npy(path)
+    else:
+        data = np.memmap(path, dtype=dtype or RAW_DTYPES.get(ext, np.float64), mode='r')
+
+    if data.ndim == 1:
+        series = DataSeries(data, name=name)
+    elif data.ndim == 2 and data.shape[1] == 1:
+        series = DataSeries(data[:, 0], name=name)
+    elif data.ndim == 2:
+        series = DataSeries(data[:, 1], xs=data[:, 0], name=name)
+    else:
+        raise ValueError(f"{name}: expected 1 or 2 dimensional data, got shape {data.shape}")
+
+    if len(series) >= LOD_MIN_SAMPLES:
+        try:
+            series.lod = load_pyramid(data_path, series.ys)
+        except OSError as ex:
+            print(f"Can't write the level of detail pyramid of {name}, drawing from the samples: {ex}")
+    return series
+
+
+def _load_npy(path):
+    # np.load raises EOFError for an empty file, callers expect a ValueError for unreadable data
+    try:
+        return np.load(path, mmap_mode='r')
+    except EOFError as ex:
+        raise ValueError(f"{os.path.basename(path)} is empty or truncated") from ex
+
+
+def load_pyramid(data_path, ys):
+    # maps <data_path>.lod.npy, (re)building it in one pass over ys when it's missing or older than the data
+    lod_path = data_path + LOD_SUFFIX
+    expected = sum(count for _, count in _lod_levels(len(ys)))
+    if os.path.exists(lod_path) and os.path.getmtime(lod_path) >= os.path.getmtime(data_path):
+        rows = np.load(lod_path, mmap_mode='r')
+        if rows.shape == (expected, 4):
+            return LodPyramid(rows, len(ys))
+
+    tmp_path = lod_path + '.tmp'
+    rows = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(expected, 4))
+    pyramid = LodPyramid(rows, len(ys))
+    _build_pyramid(pyramid, ys)
+    rows.flush()
+    del rows, pyramid
+    os.replace(tmp_path, lod_path)
+    return LodPyramid(np.load(lod_path, mmap_mode='r'), len(ys))
+
+
+def _lod_levels(num):
+    # (level, buckets) of the pyramid levels of num samples
+    level = LOD_BASE_LEVEL
+    while True:
+        count = max(1, -(-num // (1 << level)))
+        yield level, count
+        if count <= LOD_TOP_BUCKETS:
+            return
+        level += 1
+
+
+def _build_pyramid(pyramid, ys):
+    # the base level is the only pass over the samples, every other level halves the one below it
+    bucket = 1 << LOD_BASE_LEVEL
+    base = pyramid.offsets[LOD_BASE_LEVEL]
+    chunk = READ_CHUNK // bucket * bucket
+    for start in range(0, len(ys), chunk):
+        indices = _min_max_indices(ys, start, min(start + chunk, len(ys)), bucket)
+        row = base + start // bucket
+        pyramid.rows[row:row + len(indices) // 2] = np.column_stack(
+            (indices, np.asarray(ys[indices], dtype=float))).reshape(-1, 4)
+
+    # an even number of rows per read, so pairs never straddle two reads
+    rows_chunk = READ_CHUNK // 8 * 2
+    levels = sorted(pyramid.counts)
+    for lower, level in zip(levels, levels[1:]):
+        source = pyramid.offsets[lower]
+        target = pyramid.offsets[level]
+        count = pyramid.counts[lower]
+        for start in range(0, count, rows_chunk):
+            merged = _merge_rows(np.asarray(pyramid.rows[source + start:source + min(start + rows_chunk, count)]))
+            pyramid.rows[target + start // 2:target + start // 2 + len(merged)] = merged
+
+
+def _merge_rows(rows):
+    # rows of the next level from pairs of rows, an odd last row is merged with itself
+    if len(rows) % 2:
+        rows = np.concatenate((rows, rows[-1:]))
+    pairs = rows.reshape(-1, 4, 2)  # (index, y) of the 4 candidates of each merged bucket
+    indices = pairs[:, :, 0]
+    values = pairs[:, :, 1]
+
+    # nan never wins, a bucket of only nan keeps its first candidate and stays a gap
+    nan = np.isnan(values)
+    low = np.argmin(np.where(nan, np.inf, values), axis=1)
+    high = np.argmax(np.where(nan, -np.inf, values), axis=1)
+
+    picked = np.arange(len(pairs))
+    low_first = indices[picked, low] <= indices[picked, high]
+    first = np.where(low_first, low, high)
+    second = np.where(low_first, high, low)
+    return np.column_stack((indices[picked, first], values[picked, first],
+                            indices[picked, second], values[picked, second]))
+
+
+def _csv_sidecar(path):
+    # the csv is parsed once into <path>.npy, which is reused while it's newer than the csv
+    sidecar = path + '.npy'
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        return sidecar
+
+    header, rows, columns = _csv_shape(path)
+    tmp_path = sidecar + '.tmp'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(rows, columns))
+    try:
+        row = 0
+        with open(path, encoding='utf-8') as file:
+            for _ in range(header):
+                next(file)
+            # blank lines don't count as rows, so a chunk of them isn't the end of the data
+            done = False
+            while not done:
+                lines = []
+                for _ in range(CSV_CHUNK_LINES):
+                    line = file.readline()
+                    if not line:
+                        done = True
+                        break
+                    if line.strip():
+                        lines.append(line)
+                if lines:
+                    chunk = np.loadtxt(lines, delimiter=',', ndmin=2, usecols=range(columns))
+                    out[row:row + len(chunk)] = chunk
+                    row += len(chunk)
+        if row != rows:
+            raise ValueError(f"{os.path.basename(path)}: {row} rows read, {rows} expected")
+        out.flush()
+    except BaseException:
+        del out
+        os.remove(tmp_path)
+        raise
+    del out
+    os.replace(tmp_path, sidecar)
+    return sidecar
+
+
+def _csv_shape(path):
+    # (header lines, data rows, columns), the header is every line before the first numeric one
+    header = rows = columns = 0
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not rows:
+                try:
+                    columns = len([float(value) for value in line.split(',')])
+                except ValueError:
+                    header += 1
+                    continue
+            if line.strip():
+                rows += 1
+    if not rows:
+        raise ValueError(f"{os.path.basename(path)}: no numeric rows")
+    return header, rows, columns
@@ -0,0 +1,23 @@
+import numpy as np
+
+
+def m4_indices(px, py):
+    # M4 decimation: for every pixel column keep the first, min, max and last point.
+    # px must be non-decreasing (one connected run of a curve); drawing the kept points
+    # as a polyline rasterizes to the same pixels as drawing all of them.
+    num = len(px)
+    if num <= 4:
+        return np.arange(num)
+
+    columns = np.floor(px)
+    starts = np.flatnonzero(np.concatenate(([True], columns[1:] != columns[:-1])))
+    ends = np.concatenate((starts[1:], [num])) - 1
+    if len(starts) * 4 >= num:
+        return np.arange(num)
+
+    group = np.repeat(np.arange(len(starts)), np.diff(np.concatenate((starts, [num]))))
+    order = np.lexsort((py, group))  # sorted by y inside every column
+    argmin = order[starts]
+    argmax = order[ends]
+
+    return np.unique(np.concatenate((starts, argmin, argmax, ends)))
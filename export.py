@@ -0,0 +1,158 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication
+
+import final
+from expr_cache import ExpressionCache
+from sampling import scalar_evaluator
+
+DEFAULT_RANGE = (-10, 10)
+DEFAULT_STEP = 0.1
+DEFAULT_SIZE = (800, 600)
+NAME_LENGTH = 40  # characters of the expression used in default file names
+VECTOR_FORMATS = ('.svg', '.pdf')
+
+_app = None
+_cache = None
+
+
+def render_job(job):
+    # renders one job to its png, svg or pdf by the output's extension, returns (output, ms, error)
+    started = time.perf_counter()
+    try:
+        _render(job)
+    except Exception as ex:
+        return job['output'], None, str(ex)
+    return job['output'], (time.perf_counter() - started) * 1000, None
+
+
+def _render(job):
+    _init_worker()
+    widget = final.ChartWidget()
+    widget.setAttribute(Qt.WA_DontShowOnScreen)
+    widget.resize(*job['size'])
+    widget.show()
+    try:
+        if job.get('view'):
+            widget.fit_view(*job['view'])
+
+        text = job['expr']
+        func = _cache.get(text, 'math')
+        x_start, x_end = job['range']
+        if job.get('cones'):
+            widget.draw_function_cones(func, x_start, x_end, step=job['step'])
+        else:
+            widget.draw_function(_cache.get(text, 'numpy'), x_start, x_end, step=job['step'],
+                                 fallback=scalar_evaluator(func))
+
+        if os.path.splitext(job['output'])[1].lower() in VECTOR_FORMATS:
+            widget.export_vector(job['output'])
+        elif not widget.to_image().save(job['output']):
+            raise OSError(f"can't write {job['output']}")
+    finally:
+        widget.wait_for_render()
+        widget.close()
+        widget.deleteLater()
+
+
+def _init_worker():
+    # every process renders through its own offscreen application and expression cache
+    global _app, _cache
+    if _app is None:
+        _app = QApplication.instance() or QApplication(sys.argv[:1])
+        _cache = ExpressionCache()
+
+
+def run(jobs, workers):
+    # yields the results of render_job as jobs finish, in-process when there's a single worker
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield render_job(job)
+        return
+
+    # spawn instead of fork, Qt doesn't survive a fork
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker) as executor:
+        for future in as_completed([executor.submit(render_job, job) for job in jobs]):
+            yield future.result()
+
+
+def make_jobs(args):
+    # jobs from the json file first, then one per expression on the command line
+    specs = []
+    if args.job:
+        with open(args.job, encoding='utf-8') as file:
+            specs.extend(json.load(file))
+    for text in args.exprs:
+        specs.append({'expr': text, 'from': args.x_start, 'to': args.x_end, 'step': args.step,
+                      'cones': args.cones, 'view': args.view})
+
+    jobs = []
+    for index, spec in enumerate(specs):
+        name = spec.get('output') or \
+            f"{index:04d}-{re.sub(r'[^A-Za-z0-9.-]+', '_', spec['expr'])[:NAME_LENGTH]}.{args.format}"
+        jobs.append({'expr': spec['expr'],
+                     'range': (spec.get('from', DEFAULT_RANGE[0]), spec.get('to', DEFAULT_RANGE[1])),
+                     'step': spec.get('step', DEFAULT_STEP),
+                     'cones': spec.get('cones', False),
+                     'view': spec.get('view'),
+                     'size': tuple(spec.get('size', args.size)),
+                     'output': os.path.join(args.output_dir, name)})
+    return jobs
+
+
+def _size(text):
+    width, _, height = text.partition('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renders plots to png, svg or pdf files without opening a window.")
+    parser.add_argument('exprs', nargs='*', help="expressions to plot with the options below")
+    parser.add_argument('--job', help="json file with a list of jobs: {expr, from, to, step, cones, view, size, "
+                                      "output}, all but expr optional")
+    parser.add_argument('--from', dest='x_start', type=float, default=DEFAULT_RANGE[0])
+    parser.add_argument('--to', dest='x_end', type=float, default=DEFAULT_RANGE[1])
+    parser.add_argument('--step', type=float, default=DEFAULT_STEP)
+    parser.add_argument('--cones', action='store_true', help="draw cones instead of a curve")
+    parser.add_argument('--view', type=float, nargs=4, metavar=('X_LEFT', 'X_RIGHT', 'Y_BOTTOM', 'Y_TOP'),
+                        help="visible area, by default the window's initial view")
+    parser.add_argument('--size', type=_size, default=DEFAULT_SIZE, help="image size as WIDTHxHEIGHT")
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--format', choices=['png', 'svg', 'pdf'], default='png',
+                        help="format of outputs the job doesn't name, default %(default)s")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes, default %(default)s")
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args)
+    if not jobs:
+        parser.error("nothing to render, give expressions or --job")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    failed = 0
+    for output, elapsed, error in run(jobs, args.workers):
+        if error is not None:
+            failed += 1
+            print(f"Can't render {output}: {error}")
+        else:
+            print(f"{output}  {elapsed:.0f} ms")
+
+    print(f"{len(jobs) - failed} of {len(jobs)} plots in {time.perf_counter() - started:.1f} s")
+    final.parallel_eval.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
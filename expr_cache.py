@@ -0,0 +1,160 @@
+import builtins
+import json
+import os
+from collections import OrderedDict
+
+from fast_expr import BACKENDS, ExpressionError, compile_expression
+from instrumentation import tracer
+
+WARM_UP_EXPRESSION = 'sin(x) + x**2'  # parsed once ahead of the first plot
+
+
+def normalize_expression(text: str) -> str:
+    # cheap textual normalization so "x ^ 2" and "x**2" share one cache entry
+    return "".join(text.split()).replace('^', '**')
+
+
+def warm_up():
+    # imports sympy and compiles one expression for every backend, which also loads the parser and
+    # code printer modules sympy imports on first use. Half a second that the first plot doesn't wait for
+    from sympy import symbols, sympify, lambdify
+
+    expr = sympify(WARM_UP_EXPRESSION)
+    for backend in BACKENDS:
+        lambdify(symbols('x'), expr, modules=_modules(backend))
+
+
+def _modules(backend):
+    # names missing from math (special functions) are taken from mpmath, per sample only
+    return [backend, 'mpmath'] if backend == 'math' else [backend]
+
+
+class ExpressionCache:
+    # LRU cache of compiled expressions keyed by (normalized text, backend). What fast_expr can
+    # compile skips sympy, the rest is lambdified. With persist_path set, the generated source of
+    # every compiled function is kept in a json file and exec'd on the next start instead of running
+    # sympify/lambdify again.
+
+    def __init__(self, max_size=128, persist_path=None):
+        self.max_size = max_size
+        self.persist_path = persist_path
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.fast_compiles = 0
+
+        self._funcs = OrderedDict()
+        self._sources = OrderedDict()
+        self._last_parsed = (None, None)
+
+        if persist_path:
+            self._load_sources()
+
+    def get(self, text: str, backend='math'):
+        key = (normalize_expression(text), backend)
+        func = self._funcs.get(key)
+        if func is not None:
+            self._funcs.move_to_end(key)
+            self.hits += 1
+            return func
+
+        self.misses += 1
+        func = self._from_source(key)
+        if func is not None:
+            self.disk_hits += 1
+        else:
+            func = self._compile(key)
+
+        self._funcs[key] = func
+        if len(self._funcs) > self.max_size:
+            self._funcs.popitem(last=False)
+        return func
+
+    def clear(self):
+        self._funcs.clear()
+        self._sources.clear()
+        self.hits = self.misses = self.disk_hits = self.fast_compiles = 0
+        if self.persist_path:
+            self._save_sources()
+
+    def stats(self) -> dict:
+        return {'size': len(self._funcs), 'max_size': self.max_size, 'hits': self.hits,
+                'misses': self.misses, 'disk_hits': self.disk_hits, 'fast_compiles': self.fast_compiles}
+
+    def _compile(self, key):
+        text, backend = key
+        try:
+            with tracer.span('fast compile', expr=text, backend=backend):
+                func = compile_expression(text, backend)
+            self.fast_compiles += 1
+            return func
+        except ExpressionError:
+            pass
+
+        from sympy import symbols, sympify, lambdify
+        import inspect
+
+        if self._last_parsed[0] != text:
+            with tracer.span('sympify', expr=text):
+                self._last_parsed = (text, sympify(text))
+
+        with tracer.span('lambdify', expr=text, backend=backend):
+            func = lambdify(symbols('x'), self._last_parsed[1], modules=_modules(backend))
+
+        if self.persist_path and self._is_portable(func, backend):
+            self._sources[self._source_key(key)] = inspect.getsource(func)
+            self._sources.move_to_end(self._source_key(key))
+            while len(self._sources) > self.max_size:
+                self._sources.popitem(last=False)
+            self._save_sources()
+
+        return func
+
+    def _from_source(self, key):
+        source = self._sources.get(self._source_key(key))
+        if source is None:
+            return None
+
+        namespace = dict(vars(BACKENDS[key[1]]))
+        try:
+            exec(source, namespace)
+        except Exception as ex:
+            print(f"Dropping cached source for {key[0]}: {ex}")
+            del self._sources[self._source_key(key)]
+            return None
+
+        self._sources.move_to_end(self._source_key(key))
+        return namespace['_lambdifygenerated']
+
+    @staticmethod
+    def _is_portable(func, backend):
+        # only sources that resolve against the bare backend module can be restored without sympy
+        module = BACKENDS[backend]
+        return all(hasattr(module, name) or hasattr(builtins, name) for name in func.__code__.co_names)
+
+    @staticmethod
+    def _source_key(key):
+        return f"{key[1]}:{key[0]}"
+
+    def _load_sources(self):
+        try:
+            with open(self.persist_path, encoding='utf-8') as file:
+                self._sources.update(json.load(file))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as ex:
+            print(f"Can't read expression cache {self.persist_path}: {ex}")
+
+    def _save_sources(self):
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = self.persist_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._sources, file, indent=1)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as ex:
+            print(f"Can't write expression cache {self.persist_path}: {ex}")
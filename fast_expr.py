@@ -0,0 +1,203 @@
+import math
+import re
+
+import numpy as np
+
+BACKENDS = {'math': math, 'numpy': np}
+VARIABLE = 'x'
+CONSTANTS = {'pi': 'pi', 'E': 'e'}
+
+# name: (numpy, math) code of the call, {0} and {1} are the arguments. The number of
+# arguments is taken from the templates, log also has a two argument form
+FUNCTIONS = {
+    'sin': ('sin({0})', 'sin({0})'),
+    'cos': ('cos({0})', 'cos({0})'),
+    'tan': ('tan({0})', 'tan({0})'),
+    'cot': ('(1/tan({0}))', '(1/tan({0}))'),
+    'sec': ('(1/cos({0}))', '(1/cos({0}))'),
+    'csc': ('(1/sin({0}))', '(1/sin({0}))'),
+    'asin': ('arcsin({0})', 'asin({0})'),
+    'acos': ('arccos({0})', 'acos({0})'),
+    'atan': ('arctan({0})', 'atan({0})'),
+    'atan2': ('arctan2({0}, {1})', 'atan2({0}, {1})'),
+    'sinh': ('sinh({0})', 'sinh({0})'),
+    'cosh': ('cosh({0})', 'cosh({0})'),
+    'tanh': ('tanh({0})', 'tanh({0})'),
+    'asinh': ('arcsinh({0})', 'asinh({0})'),
+    'acosh': ('arccosh({0})', 'acosh({0})'),
+    'atanh': ('arctanh({0})', 'atanh({0})'),
+    'exp': ('exp({0})', 'exp({0})'),
+    'log': ('log({0})', 'log({0})'),
+    'ln': ('log({0})', 'log({0})'),
+    'sqrt': ('sqrt({0})', 'sqrt({0})'),
+    'abs': ('abs({0})', 'abs({0})'),
+    'Abs': ('abs({0})', 'abs({0})'),
+    'floor': ('floor({0})', 'floor({0})'),
+    'ceiling': ('ceil({0})', 'ceil({0})'),
+}
+LOG_BASE = ('(log({0})/log({1}))', '(log({0})/log({1}))')
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|(?P<name>[A-Za-z_]\w*)'
+                      r'|(?P<op>\*\*|[-+*/^(),]))')
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def compile_expression(text, backend='numpy'):
+    # f(x) for arithmetic, powers and the elementary functions of FUNCTIONS over the math or numpy
+    # module, without sympy. Raises ExpressionError for anything else, callers fall back to sympy
+    source = f"def _fastexpr({VARIABLE}):\n    return {to_source(text, backend)}\n"
+    namespace = dict(vars(BACKENDS[backend]))
+    exec(source, namespace)
+    return namespace['_fastexpr']
+
+
+def supports(text):
+    try:
+        parse(text)
+    except ExpressionError:
+        return False
+    return True
+
+
+def to_source(text, backend='numpy'):
+    return _emit(parse(text), 0 if backend == 'numpy' else 1)
+
+
+def parse(text):
+    # tree of tuples: ('number', text), ('variable',), ('constant', name), ('neg', operand),
+    # ('binary', op, left, right), ('call', name, args)
+    parser = _Parser(_tokens(text))
+    tree = parser.expression()
+    if parser.peek() is not None:
+        raise ExpressionError(f"unexpected {parser.peek()[1]!r}")
+    return tree
+
+
+def _tokens(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            raise ExpressionError(f"can't read {text[position:].strip()!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append((kind, '**' if value == '^' else value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    # recursive descent with python's precedence: -x**2 is -(x**2), 2**-x is 2**(-x), powers
+    # group to the right
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._position = 0
+
+    def peek(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else None
+
+    def expression(self):
+        tree = self._term()
+        while self._next_is('+', '-'):
+            op = self._take()[1]
+            tree = ('binary', op, tree, self._term())
+        return tree
+
+    def _term(self):
+        tree = self._unary()
+        while self._next_is('*', '/'):
+            op = self._take()[1]
+            tree = ('binary', op, tree, self._unary())
+        return tree
+
+    def _unary(self):
+        if self._next_is('-'):
+            self._take()
+            return ('neg', self._unary())
+        if self._next_is('+'):
+            self._take()
+            return self._unary()
+        return self._power()
+
+    def _power(self):
+        tree = self._atom()
+        if self._next_is('**'):
+            self._take()
+            tree = ('binary', '**', tree, self._unary())
+        return tree
+
+    def _atom(self):
+        token = self._take()
+        kind, value = token
+        if kind == 'number':
+            return ('number', value)
+        if kind == 'op' and value == '(':
+            tree = self.expression()
+            self._expect(')')
+            return tree
+        if kind != 'name':
+            raise ExpressionError(f"unexpected {value!r}")
+
+        if not self._next_is('('):
+            if value == VARIABLE:
+                return ('variable',)
+            if value in CONSTANTS:
+                return ('constant', value)
+            raise ExpressionError(f"unknown name {value!r}")
+
+        if value not in FUNCTIONS:
+            raise ExpressionError(f"unknown function {value!r}")
+        self._take()
+        args = [self.expression()]
+        while self._next_is(','):
+            self._take()
+            args.append(self.expression())
+        self._expect(')')
+
+        arity = FUNCTIONS[value][0].count('{')
+        if len(args) != arity and not (value == 'log' and len(args) == 2):
+            raise ExpressionError(f"{value} takes {arity} argument(s), got {len(args)}")
+        return ('call', value, args)
+
+    def _next_is(self, *ops):
+        token = self.peek()
+        return token is not None and token[0] == 'op' and token[1] in ops
+
+    def _take(self):
+        token = self.peek()
+        if token is None:
+            raise ExpressionError("unexpected end of expression")
+        self._position += 1
+        return token
+
+    def _expect(self, op):
+        if not self._next_is(op):
+            token = self.peek()
+            raise ExpressionError(f"expected {op!r}, got {token[1] if token else 'end'!r}")
+        self._take()
+
+
+def _emit(tree, column):
+    # python source of a tree with every operation in parentheses, column picks the backend template
+    kind = tree[0]
+    if kind == 'number':
+        # as float, so integer powers of integers can't turn into huge exact ints
+        return repr(float(tree[1]))
+    if kind == 'variable':
+        return VARIABLE
+    if kind == 'constant':
+        return CONSTANTS[tree[1]]
+    if kind == 'neg':
+        return f"(-{_emit(tree[1], column)})"
+    if kind == 'binary':
+        return f"({_emit(tree[2], column)} {tree[1]} {_emit(tree[3], column)})"
+
+    name, args = tree[1], [_emit(arg, column) for arg in tree[2]]
+    template = LOG_BASE[column] if name == 'log' and len(args) == 2 else FUNCTIONS[name][column]
+    return template.format(*args)
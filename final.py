@@ -1,14 +1,34 @@
 import math
+import os
 import sys
+import time
 from functools import partial
 
-from PIL.ImageQt import QPixmap
-from PySide6.QtCore import QRect, QPoint
-from PySide6.QtGui import QPainter, QPen, Qt, QColor, QPolygon, QBrush, QWheelEvent
-from PySide6.QtWidgets import QMainWindow, QWidget, QApplication, QVBoxLayout
-from sympy import symbols, sympify, lambdify
+from instrumentation import PROFILE_STARTUP_FLAG, import_profiler, tracer
 
+# before the imports below, so they show up in the profile
+if PROFILE_STARTUP_FLAG in sys.argv:
+    import_profiler.install()
+
+import numpy as np
+from PySide6.QtCore import QRect, QStandardPaths, QRectF, QSize, QTimer
+from PySide6.QtGui import QPainter, QPen, Qt, QColor, QWheelEvent, QKeySequence, QShortcut, QRegion, QPixmap
+from PySide6.QtWidgets import QMainWindow, QWidget, QApplication, QVBoxLayout, QFileDialog, QInputDialog
+
+from chart import create_canvas
+from cones import BASE_RATIO, draw_cones
+from decimation import m4_indices
+from expr_cache import ExpressionCache, warm_up
+from fast_expr import supports
 from gui import Ui_MainWindow
+import parallel_eval
+from parallel_eval import ParallelEvaluator
+from preload import Preloader
+from qt_arrays import to_qpolygonf
+from render_worker import Evaluator, Renderer
+from sampling import adaptive_sample, strided_grid, scalar_evaluator, SampleCache
+from tile_cache import TileCache, TILE_SIZE, tile_range
+from view_transform import ViewTransform
 
 AXIS_DX_RATIO = 0.06  # left indent
 AXIS_DY_RATIO = 0.05  # right indent
@@ -16,6 +36,27 @@ AXIS_DY_RATIO = 0.05  # right indent
 COLS_RATIO = 0.05
 ROWS_RATIO = 0.05
 
+EXPR_CACHE_SIZE = 64
+PERSIST_EXPR_CACHE = True  # keep compiled expressions between runs
+
+ZOOM_FACTOR = 1.1
+DOT_PERIOD = 3  # length of the Qt.DotLine pattern for a 1px pen
+
+COORD_LIMIT = 2 ** 30  # pixel coords beyond this can't be passed to QPainter
+
+DATA_FILE_FILTER = "Data (*.npy *.csv *.f32 *.f64 *.bin *.dat);;All files (*)"
+VECTOR_FILE_FILTER = "SVG (*.svg);;PDF (*.pdf)"
+FIT_MARGIN = 0.05  # part of the view left empty around fitted data
+LABEL_FIXED_LIMIT = 1e4  # axis labels from this magnitude on are in short scientific form
+
+STREAM_FPS = 30  # frames per second a live series is redrawn at most
+STREAM_WINDOW = 1000  # x-range shown while streaming, in logical units
+STREAM_ENV = 'PLOTTER_STREAM'  # set to a stream source to start streaming from it
+
+GL_MAX_POINTS = 1 << 22  # samples or cones of a plot the OpenGL canvas uploads, larger plots are thinned out
+CONE_WIDTH = 1.0  # in logical units
+TRACE_ENV = 'PLOTTER_TRACE'  # set to a json path to record spans from the start and save them on exit
+
 
 class MainApp(QMainWindow):
     def __init__(self):
@@ -23,7 +64,13 @@ class MainApp(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        self._chart_widget = ChartWidget(parent=self.ui.plot_wdgt)
+        self._chart_widget = create_canvas(ChartWidget, GLChartWidget, self.ui.plot_wdgt)
+
+        persist_path = None
+        if PERSIST_EXPR_CACHE:
+            cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+            persist_path = os.path.join(cache_dir, 'expressions.json')
+        self._expr_cache = ExpressionCache(EXPR_CACHE_SIZE, persist_path)
 
         layout = QVBoxLayout(self.ui.plot_wdgt)
         layout.setContentsMargins(0, 0, 0, 0)
@@ -33,19 +80,127 @@ class MainApp(QMainWindow):
         self.ui.clear_btn.clicked.connect(self._chart_widget.clear_canvas)
         self.ui.center_btn.clicked.connect(self._chart_widget.draw_central_dot)
 
+        QShortcut(QKeySequence("Ctrl+D"), self, self._chart_widget.toggle_decimation)
+        QShortcut(QKeySequence("Ctrl+F"), self, self._chart_widget.toggle_overlay)
+        QShortcut(QKeySequence("Ctrl+T"), self, self.toggle_trace)
+        QShortcut(QKeySequence("Ctrl+O"), self, self.open_data_file)
+        QShortcut(QKeySequence("Ctrl+L"), self, self.toggle_stream)
+        QShortcut(QKeySequence("Ctrl+E"), self, self.export_view)
+        self._stream_reader = None
+
+        # sympy, needed for expressions fast_expr can't compile, is imported and warmed up on a thread
+        # once the window shows, see start_preload
+        self._preload = Preloader([warm_up], self)
+        self._preload.finished.connect(self._on_preloaded)
+
+    def start_preload(self):
+        self._preload.start()
+
+    def _on_preloaded(self):
+        import_profiler.mark('preload finished')
+        import_profiler.finish()
+
+    def open_data_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open data series", "", DATA_FILE_FILTER)
+        if path:
+            self.plot_data_file(path)
+
+    def plot_data_file(self, path):
+        # the file is memory-mapped, only the samples of the visible range are read when drawing
+        from data_series import open_series
+
+        try:
+            series = open_series(path)
+        except (OSError, ValueError) as ex:
+            print(f"Can't open {path}: {ex}")
+            return
+
+        self._chart_widget.fit_view(*series.x_range(), *series.y_range())
+        self._chart_widget.draw_data(series)
+
+    def export_view(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export view", "", VECTOR_FILE_FILTER)
+        if not path:
+            return
+        try:
+            self._chart_widget.export_vector(path)
+        except (OSError, ValueError) as ex:
+            print(f"Can't export {path}: {ex}")
+
+    def toggle_stream(self):
+        if self._chart_widget.is_streaming():
+            self.stop_stream()
+            return
+
+        source, ok = QInputDialog.getText(self, "Live data", "File to follow, tcp://host:port or - for stdin:")
+        if ok and source:
+            self.start_stream(source)
+
+    def start_stream(self, source):
+        # a reader thread fills the ring buffer, the chart draws what arrived at up to STREAM_FPS
+        from live_series import RingSeries, StreamReader
+
+        series = RingSeries(name=source)
+        self._stream_reader = StreamReader(source, series)
+        self._chart_widget.start_stream(series)
+        self._stream_reader.start()
+
+    def stop_stream(self):
+        if self._stream_reader is not None:
+            self._stream_reader.stop()
+            self._stream_reader = None
+        self._chart_widget.stop_stream()
+
+    def toggle_trace(self):
+        # the first press starts recording spans, the second one saves them as a Chrome trace
+        if not tracer.enabled:
+            tracer.spans.clear()
+            tracer.enabled = True
+            print("Recording trace, press Ctrl+T again to save it")
+            return
+
+        tracer.enabled = False
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+        path = os.path.join(cache_dir, time.strftime('trace-%Y%m%d-%H%M%S.json'))
+        try:
+            print(f"Saved {tracer.export_chrome_trace(path)} spans to {path}")
+        except OSError as ex:
+            print(f"Can't write trace {path}: {ex}")
+
+    @tracer.traced()
     def _plot_func(self):
-        x = symbols('x')
-        expr = sympify(self.ui.func_lineEdit.text())
-        f = lambdify(x, expr, modules=['math'])
+        text = self.ui.func_lineEdit.text()
+        if not supports(text):
+            # sympy is needed, only a plot right after startup can find the preload still running
+            self._preload.wait()
+        f = self._expr_cache.get(text, 'math')
 
         if not self.ui.cones_checkBox.isChecked():
-            self._chart_widget.draw_function(f, self.ui.from_spinBox.value(), self.ui.to_spinBox.value(),
-                                             step=self.ui.step_spinBox.value())
+            # expensive expressions are spread over worker processes, cheap ones stay in process
+            f_vec = ParallelEvaluator(text, 'numpy', self._expr_cache.get(text, 'numpy'))
+            fallback = ParallelEvaluator(text, 'math', scalar_evaluator(f))
+            self._chart_widget.draw_function(f_vec, self.ui.from_spinBox.value(), self.ui.to_spinBox.value(),
+                                             step=self.ui.step_spinBox.value(), fallback=fallback)
         else:
             self._chart_widget.draw_function_cones(f, self.ui.from_spinBox.value(), self.ui.to_spinBox.value(),
                                                    step=self.ui.step_spinBox.value())
 
 
+class ViewState(ViewTransform):
+    # immutable copy of the coordinate mapping and render options, so plots can be painted
+    # on worker threads while the widget keeps panning and zooming
+    def __init__(self, axis_area, center_x, center_y, scale, range_x, range_y, height,
+                 vectorized=True, decimate=True):
+        super().__init__(axis_area, center_x, center_y, scale, range_x, range_y)
+        self.height = height  # widget height, vertical jumps larger than it are treated as poles
+        self.vectorized = vectorized
+        self.decimate = decimate
+
+        # base cell size before scaling in pixels
+        self.cell_x = 40 * scale
+        self.cell_y = 40 * scale
+
+
 class ChartWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -53,52 +208,279 @@ class ChartWidget(QWidget):
         self._pixmap = QPixmap()
         self._axis_area = QRect()
 
+        self._zoom_level = 0
         self._scale = 1.0  # current zoom level
         self._logical_range_x = 10  # default visible range in logical units (positive + negative)
         self._logical_range_y = 10
 
         self._center_coord_x = 0
         self._center_coord_y = 0
+        self._pan_x = 0  # offset of the origin from the axis area center, in pixels
+        self._pan_y = 0
+        self._last_mouse_pos = None
+        self._view_key = None
+        self._view_state = None
+
+        self._series = []  # paint callables of the plots on the canvas, oldest first
+        self._content_version = 0
+        self.vectorized = True  # evaluate draw_function over the whole x-grid with numpy
+        self.decimate = True  # reduce every pixel column to first/min/max/last points before drawing
+        self.show_overlay = False  # fps and the work of the last render on top of the plot
+
+        # plots are painted on a thread pool: a new plot arrives in vertical strips, pan/zoom
+        # compose the plot area from cached tiles and the missing ones are painted on top of
+        # a scaled copy of the previous frame. Every view change cancels the queued jobs.
+        self._tiles = TileCache()
+        self._tiles_in_flight = set()
+        self._strips_in_flight = 0
+        self._preview = None
+        self._renderer = Renderer(self)
+        self._renderer.finished.connect(self._on_rendered)
 
-        self._last_func = None
+        # a live series replaces the plots: each frame scrolls the picture and adds the new samples
+        self._stream = None
+        self._stream_tail = None  # last drawn (x, y), the next frame's line starts there
+        self._stream_timer = QTimer(self)
+        self._stream_timer.timeout.connect(self._on_stream_tick)
 
+    @tracer.traced()
     def paintEvent(self, event, /):
+        start = time.perf_counter()
         painter = QPainter(self)
         painter.drawPixmap(0, 0, self._pixmap)
+        if self.show_overlay:
+            self._draw_overlay(painter)
         painter.end()
+        tracer.record_frame(start, time.perf_counter() - start)
+
+    def _draw_overlay(self, painter):
+        stats = tracer.frame_stats()
+        counters = tracer.counters
+        text = (f"{stats['fps']:.1f} fps  {stats['frame_ms']:.2f} ms  samples {counters.get('samples', 0)}  "
+                f"segments {counters.get('segments', 0)}  cones {counters.get('cones', 0)}")
+        if self._stream is not None:
+            text += f"  received {self._stream.total}  dropped {self._stream.dropped}  waits {self._stream.waits}"
+
+        rect = painter.fontMetrics().boundingRect(text).adjusted(-4, -2, 4, 2)
+        rect.moveTo(self._axis_area.left() + 4, self._axis_area.top() + 4)
+        painter.fillRect(rect, QColor(255, 255, 255, 200))
+        painter.setPen(Qt.black)
+        painter.drawText(rect, Qt.AlignCenter, text)
 
     def resizeEvent(self, event):
         self._pixmap = QPixmap(self.width(), self.height())
-        self._pixmap.fill(QColor(224, 224, 224))
-        self._draw_coord_grid()
+        self._tiles.clear()
+        self._preview = None
+        self._redraw()
 
     def wheelEvent(self, event: QWheelEvent):
         delta = event.angleDelta().y()
-        zoom_factor = 1.1
+        old_scale = self._scale
 
-        if delta > 0:
-            self._scale *= zoom_factor
-        else:
-            self._scale /= zoom_factor
+        self._snapshot_view()
+        self._zoom_level += 1 if delta > 0 else -1
+        self._scale = ZOOM_FACTOR ** self._zoom_level
+
+        # zoom around the middle of the view
+        self._pan_x = round(self._pan_x * self._scale / old_scale)
+        self._pan_y = round(self._pan_y * self._scale / old_scale)
+        self._redraw()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._last_mouse_pos = event.position().toPoint()
+
+    def mouseMoveEvent(self, event):
+        if self._last_mouse_pos is not None:
+            pos = event.position().toPoint()
+            self._snapshot_view()
+            self._pan_x += pos.x() - self._last_mouse_pos.x()
+            self._pan_y += pos.y() - self._last_mouse_pos.y()
+            self._last_mouse_pos = pos
+            self._redraw()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._last_mouse_pos = None
+
+    def set_decimation(self, enabled):
+        # switches between the decimated and the exact polyline to compare them
+        self.decimate = enabled
+        self._content_version += 1
+        self._tiles.clear()
+        self._redraw()
+
+    def toggle_decimation(self):
+        self.set_decimation(not self.decimate)
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.update()
+
+    def wait_for_render(self, msecs=-1):
+        # blocks until queued render jobs are done, their results still arrive through the event loop
+        return self._renderer.wait(msecs)
+
+    @tracer.traced()
+    def export_vector(self, path):
+        # the current view as .svg or .pdf: every connected run of a curve is one polyline, cones are
+        # shared shapes. The plots are drawn for the whole view at once, not from tiles.
+        from vector_export import export_vector
+
+        export_vector(path, self.size(), self._paint_vector)
+
+    def _paint_vector(self, painter):
+        view = self._view()
+        area = self._axis_area
+        painter.fillRect(self.rect(), QColor(224, 224, 224))
+        painter.setClipRect(area)
+        _draw_grid_lines(painter, view, area)
+
+        paints = list(self._series)
+        if self._stream is not None:
+            paints.append(partial(_paint_data, self._stream.snapshot()))
+            # the snapshot took the samples of the next frame, it has to redraw everything
+            self._stream_tail = None
 
+        view_left, _ = view.to_cartesian_coords(area.left(), 0)
+        view_right, _ = view.to_cartesian_coords(area.right() + 1, 0)
+        for paint in paints:
+            painter.setClipRect(area)
+            paint(painter, view, view_left, view_right, area.width())
+
+        painter.setClipping(False)
+        self._draw_labels(painter, view)
+        self._draw_border(painter)
+
+    def to_image(self):
+        # the finished picture, for exports: waits for the render jobs and delivers their results
+        self.wait_for_render()
+        QApplication.processEvents()
+        return self._pixmap.toImage()
+
+    def _view(self):
+        # the mapping is rebuilt only when the axis area, center, zoom, ranges or options changed
+        key = (self._axis_area.getRect(), self._center_coord_x, self._center_coord_y, self._scale,
+               self._logical_range_x, self._logical_range_y, self.height(), self.vectorized, self.decimate)
+        if key != self._view_key:
+            self._view_key = key
+            self._view_state = ViewState(self._axis_area, self._center_coord_x, self._center_coord_y, self._scale,
+                                         self._logical_range_x, self._logical_range_y, self.height(),
+                                         self.vectorized, self.decimate)
+        return self._view_state
+
+    def _redraw(self):
+        self._cancel_rendering()
         self._pixmap.fill(QColor(224, 224, 224))
-        self._draw_coord_grid()
-        self._last_func()
+        self._draw_coord_grid(grid_lines=not self._series)
+        if not self._series:
+            if self._stream is not None:
+                self._draw_stream()
+            return
+
+        painter = QPainter(self._pixmap)
+        painter.setClipRect(self._axis_area)
+        self._draw_preview(painter)
+
+        view = self._view()
+        pending = []
+        for key, left, top in self._visible_tiles():
+            tile = self._tiles.get(key)
+            if tile is not None:
+                painter.drawPixmap(left, top, tile)
+            elif key not in self._tiles_in_flight:
+                pending.append((key, left, top))
+        self._draw_border(painter)
+        painter.end()
+
+        # closest to the middle of the view first
+        middle = self._axis_area.center()
+        pending.sort(key=lambda item: abs(item[1] + TILE_SIZE / 2 - middle.x()) +
+                                      abs(item[2] + TILE_SIZE / 2 - middle.y()))
+        for key, left, top in pending:
+            self._tiles_in_flight.add(key)
+            self._renderer.submit(key, QSize(TILE_SIZE, TILE_SIZE),
+                                  partial(_paint_tile, tuple(self._series), view, left, top), QColor(224, 224, 224))
+
+        if not pending and not self._tiles_in_flight:
+            self._preview = None
         self.update()
 
+    def _cancel_rendering(self):
+        # queued jobs are dropped, tiles already being painted still land in the cache when done
+        self._renderer.cancel()
+        self._tiles_in_flight.clear()
+        self._strips_in_flight = 0
+        # the overlay counts the work of the render that follows
+        tracer.reset_counters()
+
+    def _visible_tiles(self):
+        for ty in tile_range(self._center_coord_y, self._axis_area.top(), self._axis_area.bottom()):
+            for tx in tile_range(self._center_coord_x, self._axis_area.left(), self._axis_area.right()):
+                yield ((self._content_version, self._zoom_level, tx, ty), self._center_coord_x + tx * TILE_SIZE,
+                       self._center_coord_y + ty * TILE_SIZE)
+
+    def _on_rendered(self, key, generation, image):
+        if key[0] == 'strip':
+            # strips of a new plot are only valid for the view they were requested in
+            _, left, top = key
+            if generation == self._renderer.generation:
+                self._strips_in_flight -= 1
+                self._draw_layer(QPixmap.fromImage(image), left, top)
+            return
+
+        # tiles are anchored at the origin, so they stay valid across pan and cancellation
+        self._tiles_in_flight.discard(key)
+        if key[0] != self._content_version:
+            return
+
+        tile = QPixmap.fromImage(image)
+        self._tiles.put(key, tile)
+        for visible_key, left, top in self._visible_tiles():
+            if visible_key == key:
+                self._draw_layer(tile, left, top)
+                break
+
+        if not self._tiles_in_flight:
+            self._preview = None
+
+    def _draw_layer(self, pixmap, left, top):
+        painter = QPainter(self._pixmap)
+        painter.setClipRect(self._axis_area)
+        painter.drawPixmap(left, top, pixmap)
+        self._draw_border(painter)
+        painter.end()
+        self.update()
+
+    def _snapshot_view(self):
+        # what's on screen now stands in for tiles that aren't rendered yet at the new pan/zoom
+        if self._series and not self._axis_area.isEmpty():
+            self._preview = (self._pixmap.copy(self._axis_area), QRect(self._axis_area), self._view())
+
+    def _draw_preview(self, painter):
+        if self._preview is None:
+            return
+
+        # pixels of the old view back to cartesian, then to pixels of the current one
+        pixmap, rect, view = self._preview
+        old_to_new = view.qtransform().inverted()[0] * self._view().qtransform()
+        painter.drawPixmap(old_to_new.mapRect(QRectF(rect)), pixmap, QRectF(pixmap.rect()))
+
     def clear_canvas(self):
+        self._end_stream()
+        self._cancel_rendering()
+        self._series.clear()
+        self._content_version += 1
+        self._tiles.clear()
+        self._preview = None
         self._pixmap.fill(QColor(224, 224, 224))
         self._draw_coord_grid()
 
     def _to_pyside_coords(self, x, y):
-        px = self._center_coord_x + (x / self._logical_range_x) * (self._axis_area.width() / 2) * self._scale
-        py = self._center_coord_y - (y / self._logical_range_y) * (self._axis_area.height() / 2) * self._scale
-        return int(px), int(py)
+        return self._view().to_pyside_coords(x, y)
 
     def _to_cartesian_coords(self, px, py):
-        x = ((px - self._center_coord_x) / (self._axis_area.width() / 2)) * self._logical_range_x / self._scale
-        y = ((self._center_coord_y - py) / (self._axis_area.height() / 2)) * self._logical_range_y / self._scale
-        return x, y
+        return self._view().to_cartesian_coords(px, py)
 
     def draw_central_dot(self):
         painter = QPainter(self._pixmap)
@@ -110,114 +492,206 @@ class ChartWidget(QWidget):
         painter.end()
         self.update()
 
-    def draw_function(self, func, x_start, x_end, step=0.1):
-        self._last_func = partial(self.draw_function, func, x_start, x_end, step)
+    @tracer.traced()
+    def draw_function(self, func, x_start, x_end, step=0.1, fallback=None):
+        # fallback(xs) evaluates the curve when func can't take a numpy array, by default func per sample.
+        # Samples are cached per plot, pan/zoom/resize only evaluate points no earlier view needed
+        self._add_series(partial(_paint_function, SampleCache(func, x_start, step), x_start, x_end, step,
+                                 SampleCache(fallback or scalar_evaluator(func), x_start, step)))
 
-        painter = QPainter(self._pixmap)
-        painter.setClipRect(self._axis_area)
-        pen = QPen(Qt.blue, 2)
-        painter.setPen(pen)
-        
-        x = x_start
-        prev = None
-        while x <= x_end:
-            try:
-                y = func(x)
-                px, py = self._to_pyside_coords(x, y)
-                if math.isfinite(y):
-                    if prev is not None:
-                        if abs(prev[1] - py) < self.height():
-                            painter.drawLine(prev[0], prev[1], px, py)
-                    prev = (px, py)
-                else:
-                    prev = None
-
-            except (ZeroDivisionError, ValueError, OverflowError):
-                prev = None
-
-            except Exception as ex:
-                print(f"Error at x={x}: {ex}")
-
-            x += step
+    @tracer.traced()
+    def draw_function_cones(self, func, x_start, x_end, color=QColor(80, 160, 255), step=0.1):
+        self._add_series(partial(_paint_function_cones, SampleCache(scalar_evaluator(func), x_start, step),
+                                 x_start, x_end, color, step))
+
+    @tracer.traced()
+    def draw_data(self, series):
+        # series is a DataSeries, drawn at the resolution of the view like a function
+        self._add_series(partial(_paint_data, series))
+
+    def fit_view(self, x_left, x_right, y_bottom, y_top):
+        # shows [x_left, x_right] x [y_bottom, y_top] at zoom level 0, with separate x and y ranges
+        width = (x_right - x_left) or 1.0
+        height = (y_top - y_bottom) or 1.0
+        self._logical_range_x = width * (1 + 2 * FIT_MARGIN) / 2
+        self._logical_range_y = height * (1 + 2 * FIT_MARGIN) / 2
+        self._zoom_level = 0
+        self._scale = 1.0
+
+        # the origin's offset from the middle of the axis area puts the middle of the range there
+        self._pan_x = -round((x_left + width / 2) / self._logical_range_x * self._axis_area.width() / 2)
+        self._pan_y = round((y_bottom + height / 2) / self._logical_range_y * self._axis_area.height() / 2)
+
+        self._content_version += 1
+        self._tiles.clear()
+        self._preview = None
+        self._redraw()
+
+    def _add_series(self, paint):
+        # paint(painter, view, view_left, view_right, columns) draws the plot for the x-range of a view;
+        # all plots are kept to redraw tiles on pan/zoom. The new plot is painted over the current
+        # picture in transparent strips, the tiles after the next pan/zoom hold all of them.
+        if self._stream is not None:
+            self.stop_stream()
+        incomplete = self._strips_in_flight > 0
+        self._cancel_rendering()
+        self._series.append(paint)
+        self._content_version += 1
+        self._tiles.clear()
+        if incomplete:
+            # strips of the previous plot were dropped, all plots are painted again as tiles
+            self._redraw()
+            return
+
+        view = self._view()
+        area = self._axis_area
+        for left in range(area.left(), area.right() + 1, TILE_SIZE):
+            width = min(TILE_SIZE, area.right() + 1 - left)
+            self._strips_in_flight += 1
+            self._renderer.submit(('strip', left, area.top()), QSize(width, area.height()),
+                                  partial(_paint_strip, paint, view, QRect(left, area.top(), width, area.height())))
+
+    def start_stream(self, series, x_window=STREAM_WINDOW, fps=STREAM_FPS):
+        # draws a RingSeries as it fills, the newest sample at the right edge of the plot. Frames come
+        # from a timer, so the producer never triggers repaints itself.
+        self.clear_canvas()
+        self._stream = series
+        self._stream_tail = None
+        self._logical_range_x = x_window / 2
+        self._zoom_level = 0
+        self._scale = 1.0
+        self._pan_y = 0
+        self._stream_timer.start(max(1, round(1000 / fps)))
+        self._redraw()
 
+    def stop_stream(self):
+        # what was received stays on the canvas as a data series
+        series = self._end_stream()
+        if series is not None and len(series):
+            self._add_series(partial(_paint_data, series.snapshot()))
+
+    def is_streaming(self):
+        return self._stream is not None
+
+    def _end_stream(self):
+        series, self._stream = self._stream, None
+        self._stream_timer.stop()
+        if series is not None:
+            series.close()
+        return series
+
+    def _draw_stream(self):
+        # the whole buffer at the current view, like a data series
+        snapshot = self._stream.snapshot()
+        self._stream_tail = None
+        if not len(snapshot):
+            return
+
+        view = self._view()
+        area = self._axis_area
+        painter = QPainter(self._pixmap)
+        painter.setClipRect(area)
+        view_left, _ = view.to_cartesian_coords(area.left(), 0)
+        view_right, _ = view.to_cartesian_coords(area.right() + 1, 0)
+        _paint_data(snapshot, painter, view, view_left, view_right, area.width())
+        self._draw_border(painter)
         painter.end()
+
+        self._stream_tail = (snapshot.xs[-1], snapshot.ys[-1])
         self.update()
 
-    def draw_function_cones(self, func, x_start, x_end, color=QColor(80, 160, 255), step=0.1):
-        self._last_func = partial(self.draw_function_cones, func, x_start, x_end, color, step)
+    @tracer.traced()
+    def _on_stream_tick(self):
+        xs, ys = self._stream.take()
+        if not len(xs):
+            return
+
+        tracer.count('samples', len(xs))
+        refit = self._fit_stream_y(ys)
+        pan_x = self._stream_pan(xs[-1])
+        shift = pan_x - self._pan_x
+        if refit or self._stream_tail is None or not -self._axis_area.width() < shift <= 0:
+            self._pan_x = pan_x
+            self._redraw()
+            return
+
+        # the picture moves left by whole pixels, only the exposed strip and the new samples are drawn
+        area = self._axis_area
+        self._pan_x = pan_x
+        self._center_coord_x += shift
+        view = self._view()
+        if shift:
+            self._pixmap.scroll(shift, 0, area)
 
         painter = QPainter(self._pixmap)
-        painter.setClipRect(self._axis_area)
+        if shift:
+            exposed = QRect(area.right() + 1 + shift, area.top(), -shift, area.height())
+            painter.fillRect(exposed, QColor(224, 224, 224))
+            painter.setClipRect(exposed)
+            _draw_grid_lines(painter, view, exposed)
 
-        cone_width = 1.0
-        x = x_start
-        prev_y = None
-        max_y_jump = (self._logical_range_y * 0.3)
-        while x <= x_end:
-            try:
-                y = func(x)
-
-                if not math.isfinite(y):
-                    prev_y = None
-                    x += step
-                    continue
-
-                if prev_y is not None and abs(y - prev_y) > max_y_jump:
-                    prev_y = y
-                    x += step
-                    continue
-
-                qt_top_x, qt_top_y = self._to_pyside_coords(x, y)
-                qt_left_x, qt_left_y = self._to_pyside_coords(x - cone_width / 2, 0)
-                qt_right_x, qt_right_y = self._to_pyside_coords(x + cone_width / 2, 0)
-
-                top_point = QPoint(qt_top_x, qt_top_y)
-                left_point = QPoint(qt_left_x, qt_left_y)
-                right_point = QPoint(qt_right_x, qt_right_y)
-
-                cone = QPolygon([top_point, left_point, right_point])
-                painter.setBrush(QBrush(color))
-                painter.setPen(QPen(QColor(0, 0, 0), 0.5))
-                painter.drawPolygon(cone)
-
-                # Преобразуем центр и радиусы
-                cx, cy = self._to_pyside_coords(x, 0)
-                rx = abs(left_point.x() - right_point.x()) // 2
-                ry = int(0.1 * abs(y) * self._scale * (self._axis_area.height() / (2 * self._logical_range_y)))
-
-                # QRect, in ellipse
-                rect = QRect(cx - rx, cy - ry, 2 * rx, 2 * ry)
-
-                # Left side
-                painter.setPen(Qt.NoPen)
-                painter.setBrush(QBrush(color.darker(150)))
-                painter.drawPie(rect, 180 * 16, 90 * 16)  # from 180° to 270° left
-
-                # Right side
-                painter.setBrush(QBrush(color))
-                painter.drawPie(rect, 270 * 16, 90 * 16)
-
-                # Draw shadow
-                shadow = QPolygon([top_point, left_point, QPoint(top_point.x(), left_point.y())])
-                painter.setBrush(QBrush(color.darker(150)))
-                painter.drawPolygon(shadow)
-
-            except (ZeroDivisionError, ValueError, OverflowError):
-                prev_y = None
-            except Exception as e:
-                print(f"Error at x={x}: {e}")
-
-            x += step
+            # labels move with the grid
+            painter.setClipRegion(QRegion(self.rect()).subtracted(QRegion(area.adjusted(0, 0, 1, 1))))
+            painter.fillRect(self.rect(), QColor(224, 224, 224))
+            painter.setClipping(False)
+            self._draw_labels(painter, view)
 
+        painter.setClipRect(area)
+        tail_x, tail_y = self._stream_tail
+        px, py = view.to_pyside_coords_array(np.concatenate(([tail_x], xs)), np.concatenate(([tail_y], ys)))
+        tracer.count('segments', _draw_curve(painter, view, px, py, max_jump=np.inf))
+        self._draw_border(painter)
         painter.end()
+
+        self._stream_tail = (xs[-1], ys[-1])
         self.update()
 
-    def _draw_coord_grid(self):
+    def _stream_pan(self, x):
+        # pan that puts x at the right edge of the axis area
+        area = self._axis_area
+        px = x * self._view().unit_x
+        return round(area.right() - px - area.left() - int(area.width() / 2))
+
+    def _fit_stream_y(self, ys):
+        # grows the y-range to take in new samples outside of it, returns whether it changed
+        ys = ys[np.isfinite(ys)]
+        if not len(ys):
+            return False
+
+        view = self._view()
+        _, top = view.to_cartesian_coords(0, self._axis_area.top())
+        _, bottom = view.to_cartesian_coords(0, self._axis_area.bottom())
+        low, high = float(ys.min()), float(ys.max())
+        if self._stream_tail is not None:
+            if bottom <= low and high <= top:
+                return False
+            low, high = min(low, bottom), max(high, top)
+
+        height = (high - low) or 2.0
+        self._logical_range_y = height * (1 + 2 * FIT_MARGIN) / 2 * self._scale
+        self._pan_y = round((low + height / 2) / self._logical_range_y * self._axis_area.height() / 2 * self._scale)
+        return True
+
+    @tracer.traced()
+    def _draw_coord_grid(self, grid_lines=True):
+        self._layout_axis_area()
         painter = QPainter(self._pixmap)
-        border_pen = QPen(Qt.black, 1, Qt.SolidLine)
-        painter.setPen(border_pen)
+        self._draw_border(painter)
+        view = self._view()
+
+        # grid lines go to tiles when there is a plot to cache
+        if grid_lines:
+            painter.save()
+            painter.setClipRect(self._axis_area)
+            _draw_grid_lines(painter, view, self._axis_area)
+            painter.restore()
+
+        self._draw_labels(painter, view)
+        painter.end()
+        self.update()
 
-        # draw chart border (viewport)
+    def _layout_axis_area(self):
+        # chart border (viewport) and the origin's position in it
         x_indent = int(self.width() * AXIS_DX_RATIO)
         y_indent = int(self.height() * AXIS_DY_RATIO)
 
@@ -230,67 +704,401 @@ class ChartWidget(QWidget):
             self.width() - x_indent - int(x_indent * x_indent_ratio),
             self.height() - y_indent
         )
-        painter.drawRect(self._axis_area)
 
         # center in screen coords
-        self._center_coord_x = self._axis_area.left() + int(self._axis_area.width() / 2)
-        self._center_coord_y = self._axis_area.top() + int(self._axis_area.height() / 2)
-
-        # base cell size before scaling in pixels
-        base_cell_x = 40  # arbitrary default unit size
-        base_cell_y = 40
+        self._center_coord_x = self._axis_area.left() + int(self._axis_area.width() / 2) + self._pan_x
+        self._center_coord_y = self._axis_area.top() + int(self._axis_area.height() / 2) + self._pan_y
 
-        self._cell_scale_x = base_cell_x * self._scale
-        self._cell_scale_y = base_cell_y * self._scale
-
-        grid_pen = QPen(Qt.black, 1, Qt.DotLine)
-        painter.setPen(grid_pen)
+    def _draw_labels(self, painter, view):
+        painter.setPen(QPen(Qt.black, 1, Qt.DotLine))
         font_metrics = painter.fontMetrics()
 
-        # draw vertical grid lines (infinite to left/right)
-        x = self._center_coord_x
-        while x <= self._axis_area.right():
-            painter.drawLine(int(x), self._axis_area.top(), int(x), self._axis_area.bottom())
-            cart_x, _ = self._to_cartesian_coords(x, 0)
-            text = f"{cart_x:.1f}"
+        # labels of vertical grid lines, one that would overlap the previous label is left out
+        label_end = None
+        for x in _grid_positions(view.center_x, view.cell_x, self._axis_area.left(), self._axis_area.right()):
+            cart_x, _ = view.to_cartesian_coords(x, 0)
+            text = _axis_label(cart_x)
             w = font_metrics.horizontalAdvance(text)
+            if label_end is not None and int(x - w / 2) < label_end:
+                continue
             painter.drawText(int(x - w / 2), self._axis_area.bottom() + font_metrics.height(), text)
-            x += self._cell_scale_x
+            label_end = int(x - w / 2) + w + 5
 
-        x = self._center_coord_x - self._cell_scale_x
-        while x >= self._axis_area.left():
-            painter.drawLine(int(x), self._axis_area.top(), int(x), self._axis_area.bottom())
-            cart_x, _ = self._to_cartesian_coords(x, 0)
-            text = f"{cart_x:.1f}"
-            w = font_metrics.horizontalAdvance(text)
-            painter.drawText(int(x - w / 2), self._axis_area.bottom() + font_metrics.height(), text)
-            x -= self._cell_scale_x
-
-        # draw horizontal grid lines (infinite up/down)
-        y = self._center_coord_y
-        while y <= self._axis_area.bottom():
-            painter.drawLine(self._axis_area.left(), int(y), self._axis_area.right(), int(y))
-            _, cart_y = self._to_cartesian_coords(0, y)
-            text = f"{cart_y:.1f}"
+        # labels of horizontal grid lines
+        for y in _grid_positions(view.center_y, view.cell_y, self._axis_area.top(), self._axis_area.bottom()):
+            _, cart_y = view.to_cartesian_coords(0, y)
+            text = _axis_label(cart_y)
             w = font_metrics.horizontalAdvance(text)
             painter.drawText(self._axis_area.left() - w - 5, int(y + font_metrics.ascent() / 2), text)
-            y += self._cell_scale_y
 
-        y = self._center_coord_y - self._cell_scale_y
-        while y >= self._axis_area.top():
-            painter.drawLine(self._axis_area.left(), int(y), self._axis_area.right(), int(y))
-            _, cart_y = self._to_cartesian_coords(0, y)
-            text = f"{cart_y:.1f}"
-            w = font_metrics.horizontalAdvance(text)
-            painter.drawText(self._axis_area.left() - w - 5, int(y + font_metrics.ascent() / 2), text)
-            y -= self._cell_scale_y
+    def _draw_border(self, painter):
+        painter.setClipping(False)
+        painter.setPen(QPen(Qt.black, 1, Qt.SolidLine))
+        painter.drawRect(self._axis_area)
 
-        painter.end()
-        self.update()
+
+class GLChartWidget(ChartWidget):
+    # the chart with its plots drawn by OpenGL instead of QPainter tiles: a plot is evaluated once over
+    # its whole range and uploaded, pan and zoom redraw it from the GPU (gl_canvas.GLPlotLayer). The
+    # layer covers the widget; axes, labels, the stream's bookkeeping and vector exports are the
+    # QPainter chart's, which keeps the paint callables of the plots for the exports only. Plots are
+    # evaluated on a background thread in the order they were added and uploaded when they're done.
+
+    def __init__(self, parent=None):
+        from gl_canvas import GLPlotLayer
+
+        super().__init__(parent)
+        self._evaluator = Evaluator(self)
+        self._evaluator.finished.connect(self._on_evaluated)
+        self._layer = GLPlotLayer(self, self._paint_under, self._paint_over)
+        self._dot_visible = False
+
+    def paintEvent(self, event, /):
+        # all of the widget is under the layer
+        pass
+
+    def resizeEvent(self, event):
+        self._layer.setGeometry(self.rect())
+        self._redraw()
+
+    def _redraw(self):
+        self._layout_axis_area()
+        self._dot_visible = False
+        self._layer.set_view(self._view())
+
+    def _snapshot_view(self):
+        # pan and zoom never wait for tiles here
+        pass
+
+    def _paint_under(self, painter):
+        painter.fillRect(self.rect(), QColor(224, 224, 224))
+        painter.setClipRect(self._axis_area)
+        # aliased 1px lines are centered on the pixel grid by the OpenGL paint engine, the raster engine
+        # draws them on the pixels right and below
+        painter.translate(0.5, 0.5)
+        _draw_grid_lines(painter, self._view(), self._axis_area)
+        painter.resetTransform()
+        painter.setClipping(False)
+
+    def _paint_over(self, painter):
+        view = self._view()
+        if self._dot_visible:
+            painter.setClipRect(self._axis_area)
+            painter.setPen(QPen(Qt.red, 5, Qt.SolidLine))
+            painter.drawPoint(*view.to_pyside_coords(0, 0))
+        self._draw_labels(painter, view)
+        self._draw_border(painter)
+        if self.show_overlay:
+            self._draw_overlay(painter)
+
+    def toggle_overlay(self):
+        super().toggle_overlay()
+        self._layer.update()
+
+    def wait_for_render(self, msecs=-1):
+        # blocks until the plots are evaluated, they're uploaded through the event loop
+        return self._evaluator.wait(msecs)
+
+    def to_image(self):
+        self.wait_for_render()
+        QApplication.processEvents()
+        return self._layer.grabFramebuffer()
+
+    def clear_canvas(self):
+        self._end_stream()
+        tracer.reset_counters()
+        self._series.clear()
+        self._content_version += 1
+        self._evaluator.cancel()
+        self._layer.clear()
+        self._redraw()
+
+    def draw_central_dot(self):
+        self._dot_visible = True
+        self._layer.update()
+
+    @tracer.traced()
+    def draw_function(self, func, x_start, x_end, step=0.1, fallback=None):
+        # the same sample caches as the paint callable, which only draws vector exports
+        func = SampleCache(func, x_start, step)
+        fallback = SampleCache(fallback or scalar_evaluator(func.func), x_start, step)
+        self._add_series(partial(_paint_function, func, x_start, x_end, step, fallback))
+        self._evaluator.submit('function', partial(self._sample_function, func, x_start, x_end, step, fallback,
+                                                   self.vectorized))
+
+    @tracer.traced()
+    def draw_function_cones(self, func, x_start, x_end, color=QColor(80, 160, 255), step=0.1):
+        evaluate = SampleCache(scalar_evaluator(func), x_start, step)
+        self._add_series(partial(_paint_function_cones, evaluate, x_start, x_end, color, step))
+        self._evaluator.submit('cones', partial(self._sample_cones, evaluate, x_start, x_end, color, step))
+
+    @tracer.traced()
+    def draw_data(self, series):
+        super().draw_data(series)
+        self._evaluator.submit('data', partial(self._read_data, series))
+
+    # the plots are evaluated on the evaluator's thread, they return the upload done on the GUI thread
+
+    def _sample_function(self, func, x_start, x_end, step, fallback, vectorized):
+        xs, ys = _sample_grid(func, x_start, x_end, step, fallback, vectorized)
+        tracer.count('samples', len(xs))
+        return partial(self._layer.add_curve, xs, ys)
+
+    def _sample_cones(self, evaluate, x_start, x_end, color, step):
+        xs = _plot_grid(x_start, x_end, step)
+        with tracer.span('evaluate_scalar', samples=len(xs)):
+            ys = evaluate(xs)
+        valid = np.isfinite(ys)
+        tracer.count('cones', int(np.count_nonzero(valid)))
+        return partial(self._layer.add_cones, xs[valid], ys[valid], color, CONE_WIDTH)
+
+    def _read_data(self, series):
+        # the finest level of detail that fits in GL_MAX_POINTS, zooming in further shows its polyline
+        from data_series import POINTS_PER_COLUMN
+
+        x_left, x_right = series.x_range()
+        level = series.lod_level(x_left, x_right, GL_MAX_POINTS // POINTS_PER_COLUMN)
+        xs, ys = series.visible(x_left, x_right, level)
+        tracer.count('samples', len(xs))
+        return partial(self._layer.add_curve, xs, ys, max_jump=np.inf)
+
+    def _on_evaluated(self, key, generation, upload):
+        # plots of a cleared canvas are dropped
+        if generation == self._evaluator.generation:
+            upload()
+
+    def _add_series(self, paint):
+        # the paint callables only draw vector exports, the layer has the plots on screen
+        if self._stream is not None:
+            self.stop_stream()
+        self._series.append(paint)
+        self._content_version += 1
+
+    def start_stream(self, series, x_window=STREAM_WINDOW, fps=STREAM_FPS):
+        super().start_stream(series, x_window, fps)
+        self._layer.start_stream(series.capacity)
+
+    def stop_stream(self):
+        series = self._end_stream()
+        if series is not None and len(series):
+            self.draw_data(series.snapshot())
+
+    def _end_stream(self):
+        series = super()._end_stream()
+        self._layer.stop_stream()
+        return series
+
+    @tracer.traced()
+    def _on_stream_tick(self):
+        # only the new samples are uploaded, the view follows them like on the QPainter canvas
+        xs, ys = self._stream.take()
+        if not len(xs):
+            return
+
+        tracer.count('samples', len(xs))
+        self._fit_stream_y(ys)
+        self._pan_x = self._stream_pan(xs[-1])
+        if self._stream_tail is None:
+            # the first frame, or a vector export took the samples with a snapshot
+            snapshot = self._stream.snapshot()
+            self._layer.reset_stream(snapshot.xs, snapshot.ys)
+        else:
+            self._layer.append_stream(xs, ys)
+        self._stream_tail = (xs[-1], ys[-1])
+        self._redraw()
+
+
+def _paint_strip(paint, view, rect, painter):
+    # draws the plot for one vertical strip of the axis area into a transparent image
+    painter.translate(-rect.left(), -rect.top())
+    painter.setClipRect(rect)
+    view_left, _ = view.to_cartesian_coords(rect.left(), 0)
+    view_right, _ = view.to_cartesian_coords(rect.right() + 1, 0)
+    paint(painter, view, view_left, view_right, rect.width())
+
+
+def _paint_tile(series, view, left, top, painter):
+    # tiles are drawn with the same widget coordinates as the full view, shifted into the image
+    rect = QRect(left, top, TILE_SIZE, TILE_SIZE)
+    painter.translate(-left, -top)
+    painter.setClipRect(rect)
+    _draw_grid_lines(painter, view, rect)
+
+    view_left, _ = view.to_cartesian_coords(rect.left(), 0)
+    view_right, _ = view.to_cartesian_coords(rect.right() + 1, 0)
+    for paint in series:
+        paint(painter, view, view_left, view_right, TILE_SIZE)
+
+
+def _draw_grid_lines(painter, view, rect):
+    grid_pen = QPen(Qt.black, 1, Qt.DotLine)
+    painter.setPen(grid_pen)
+
+    # lines start inside the rect on a dot pattern period counted from the origin, so tiles join
+    # seamlessly (the raster engine restarts the pattern where a line gets clipped)
+    top = rect.top() + (view.center_y - rect.top()) % DOT_PERIOD
+    left = rect.left() + (view.center_x - rect.left()) % DOT_PERIOD
+
+    for x in _grid_positions(view.center_x, view.cell_x, rect.left(), rect.right()):
+        painter.drawLine(int(x), top, int(x), rect.bottom())
+
+    for y in _grid_positions(view.center_y, view.cell_y, rect.top(), rect.bottom()):
+        painter.drawLine(left, int(y), rect.right(), int(y))
+
+
+def _paint_function(func, x_start, x_end, step, fallback, painter, view, view_left, view_right, columns):
+    with tracer.span('evaluate', columns=columns):
+        xs, ys = _sample_function(func, x_start, x_end, step, fallback, view, view_left, view_right, columns)
+    with tracer.span('map', samples=len(xs)):
+        px, py = view.to_pyside_coords_array(xs, ys)
+    with tracer.span('draw'):
+        segments = _draw_curve(painter, view, px, py)
+
+    tracer.count('samples', len(xs))
+    tracer.count('segments', segments)
+
+
+def _axis_label(value):
+    # large values of fitted data would overlap as fixed point
+    return f"{value:.1f}" if abs(value) < LABEL_FIXED_LIMIT else f"{value:.3g}"
+
+
+def _paint_data(series, painter, view, view_left, view_right, columns):
+    # the level of detail follows the scale, a view reads O(columns) points at any zoom
+    level = series.lod_level(view_left, view_right, columns)
+    with tracer.span('read', columns=columns, level=level):
+        xs, ys = series.visible(view_left, view_right, level)
+    with tracer.span('map', samples=len(xs)):
+        px, py = view.to_pyside_coords_array(xs, ys)
+    with tracer.span('draw'):
+        # recorded signals can be steep, only nan gaps break the line
+        segments = _draw_curve(painter, view, px, py, max_jump=np.inf)
+
+    tracer.count('samples', len(xs))
+    tracer.count('segments', segments)
+
+
+def _draw_curve(painter, view, px, py, max_jump=None):
+    # returns the number of line segments drawn; by default jumps taller than the widget are poles
+    pen = QPen(Qt.blue, 2)
+    painter.setPen(pen)
+
+    segments = 0
+    for start, end in _connected_runs(px, py, view.height if max_jump is None else max_jump):
+        run_x, run_y = px[start:end], py[start:end]
+        if view.decimate:
+            keep = m4_indices(run_x, run_y)
+            run_x, run_y = run_x[keep], run_y[keep]
+        painter.drawPolyline(to_qpolygonf(run_x, run_y))
+        segments += len(run_x) - 1
+    return segments
+
+
+def _sample_function(func, x_start, x_end, step, fallback, view, view_left, view_right, columns):
+    # samples only the visible part of the domain, with a resolution bound by the widget width. func and
+    # fallback are the SampleCaches of the plot
+    y_scale = view.unit_y
+
+    if view.vectorized and not func.failed:
+        try:
+            return adaptive_sample(func, x_start, x_end, step, view_left, view_right, columns, y_scale)
+        except Exception as ex:
+            _report_failure(func, ex)
+
+    # per-sample evaluation is kept for expressions numpy can't evaluate over an array
+    with tracer.span('evaluate_scalar'):
+        return adaptive_sample(fallback, x_start, x_end, step, view_left, view_right, columns, y_scale)
+
+
+def _report_failure(func, ex):
+    # the other tiles and strips of the plot skip the vectorized path from now on
+    if func.mark_failed():
+        print(f"Vectorized evaluation failed, using scalar path: {ex}")
+
+
+def _plot_grid(x_start, x_end, step):
+    # the whole x_start + k * step grid of a plot at once, thinned out to GL_MAX_POINTS samples
+    return strided_grid(x_start, x_end, step, x_start, x_end, (x_end - x_start) / GL_MAX_POINTS)
+
+
+def _sample_grid(func, x_start, x_end, step, fallback, vectorized):
+    # func and fallback are the SampleCaches of the plot, vector exports reuse their samples
+    xs = _plot_grid(x_start, x_end, step)
+    if vectorized and not func.failed:
+        try:
+            with tracer.span('evaluate', samples=len(xs)):
+                return xs, func(xs)
+        except Exception as ex:
+            _report_failure(func, ex)
+
+    with tracer.span('evaluate_scalar', samples=len(xs)):
+        return xs, fallback(xs)
+
+
+def _paint_function_cones(evaluate, x_start, x_end, color, step, painter, view, view_left, view_right, columns):
+    # evaluate(xs) gives the heights of the cones at xs
+    # cones narrower than a pixel column are indistinguishable, so at most one per column is drawn
+    pixel_width = (view_right - view_left) / columns
+    xs = strided_grid(x_start, x_end, step, view_left - CONE_WIDTH / 2, view_right + CONE_WIDTH / 2,
+                      pixel_width)
+    with tracer.span('evaluate_scalar', samples=len(xs)):
+        ys = evaluate(xs)
+    tracer.count('samples', len(xs))
+
+    with tracer.span('map', samples=len(xs)):
+        qt_top_x, qt_top_y = view.to_pyside_coords_array(xs, ys)
+        valid = np.isfinite(qt_top_y) & (np.abs(qt_top_y) < COORD_LIMIT)
+        xs, ys, qt_top_x, qt_top_y = xs[valid], ys[valid], qt_top_x[valid], qt_top_y[valid]
+        if not len(xs):
+            return
+
+        qt_left_x, qt_base_y = view.to_pyside_coords_array(xs - CONE_WIDTH / 2, 0)
+        qt_right_x, _ = view.to_pyside_coords_array(xs + CONE_WIDTH / 2, 0)
+        ry = np.trunc(BASE_RATIO * np.abs(ys) * view.unit_y)
+
+    with tracer.span('draw', cones=len(xs)):
+        draw_cones(painter, color, qt_top_x, qt_top_y, qt_left_x, qt_right_x, qt_base_y, ry)
+    tracer.count('cones', len(xs))
+
+
+def _grid_positions(center, cell, low, high):
+    # grid lines sit at center + k * cell, only the ones within [low, high] are returned
+    first = math.ceil((low - center) / cell)
+    last = math.floor((high - center) / cell)
+    return [center + k * cell for k in range(first, last + 1)]
+
+
+def _connected_runs(px, py, max_jump):
+    # yields (start, end) slices of points that are joined by line segments,
+    # breaking at non-finite/unpaintable points and at vertical jumps (poles)
+    valid = np.isfinite(px) & np.isfinite(py) & (np.abs(px) < COORD_LIMIT) & (np.abs(py) < COORD_LIMIT)
+    with np.errstate(invalid='ignore'):
+        joined = valid[:-1] & valid[1:] & (np.abs(np.diff(py)) < max_jump)
+
+    breaks = np.flatnonzero(~joined) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(px)]))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if end - start > 1:
+            yield start, end
 
 
 if __name__ == "__main__":
+    import_profiler.mark('imports')
     app = QApplication(sys.argv)
     window = MainApp()
+    import_profiler.mark('window created')
+    trace_path = os.environ.get(TRACE_ENV)
+    tracer.enabled = bool(trace_path)
     window.show()
-    sys.exit(app.exec())
+    import_profiler.mark('window shown')
+    window.start_preload()
+    QTimer.singleShot(0, partial(import_profiler.mark, 'first events processed'))
+    stream_source = os.environ.get(STREAM_ENV)
+    if stream_source:
+        window.start_stream(stream_source)
+    exit_code = app.exec()
+    parallel_eval.shutdown()
+    if trace_path:
+        print(f"Saved {tracer.export_chrome_trace(trace_path)} spans to {trace_path}")
+    sys.exit(exit_code)
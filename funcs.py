@@ -1,8 +1,11 @@
 import enum
 import math
+from typing import Callable, Optional, Sequence, Union
 
 import numpy as np
 
+OUTPUT_DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
 
 class Function(enum.Enum):
     sin_mult = 1
@@ -10,25 +13,56 @@ class Function(enum.Enum):
     sin_div = 3
 
 
-def func_1(x: float) -> float:
+# Function -> f(xs), evaluated on whole arrays. Scalars work as well
+_registry: dict[Function, Callable[[np.ndarray], np.ndarray]] = {}
+
+
+def register(function: Function):
+    def decorator(func):
+        _registry[function] = func
+        return func
+
+    return decorator
+
+
+def get_func(function: Function) -> Callable[[np.ndarray], np.ndarray]:
+    return _registry[function]
+
+
+@register(Function.sin_mult)
+def func_1(x: np.ndarray) -> np.ndarray:
     return 10 * np.sin(x)
 
 
-def func_2(x: float) -> float:
-    return 10 * np.sin((2 ** x + math.e ** (np.cos(abs(x)))))
+@register(Function.sin_exp)
+def func_2(x: np.ndarray) -> np.ndarray:
+    return 10 * np.sin((2 ** x + math.e ** (np.cos(np.abs(x)))))
 
 
-def func_3(x: float) -> float:
+@register(Function.sin_div)
+def func_3(x: np.ndarray) -> np.ndarray:
     return 10 / np.sin(x)
 
 
-def calculate_func(func: Function, start, end, num) -> list:
-    functions_dict = {Function.sin_mult: func_1, Function.sin_exp: func_2, Function.sin_div: func_3}
-    values_list = []
+def calculate_func(func: Union[Function, Sequence[Function]], start, end, num, dtype=np.float64,
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
+    # values at num evenly spaced points from start to end inclusive. Several functions share one grid
+    # and fill the rows of a (len(func), num) array. The grid is float64 whatever the output dtype,
+    # with out given its dtype is used and nothing is allocated for the result
+    functions = [func] if isinstance(func, Function) else list(func)
+    shape = (num,) if isinstance(func, Function) else (len(functions), num)
 
-    step = (end - start) / (num - 1)
-    for _ in range(num):
-        values_list.append(functions_dict[func](start))
-        start += step
+    if out is None:
+        dtype = np.dtype(dtype)
+        if dtype not in OUTPUT_DTYPES:
+            raise ValueError(f"can't calculate into {dtype}, use float32 or float64")
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape or out.dtype not in OUTPUT_DTYPES:
+        raise ValueError(f"out must be a float32 or float64 array of shape {shape}, got {out.dtype} {out.shape}")
 
-    return values_list
+    xs = np.linspace(start, end, num)
+    rows = out[np.newaxis] if isinstance(func, Function) else out
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for row, function in zip(rows, functions):
+            row[...] = _registry[function](xs)
+    return out
@@ -0,0 +1,555 @@
+import math
+import time
+
+import numpy as np
+from PySide6.QtGui import QColor, QOffscreenSurface, QOpenGLContext, QPainter, QSurfaceFormat, Qt
+from PySide6.QtOpenGL import QOpenGLBuffer, QOpenGLShader, QOpenGLShaderProgram, QOpenGLVertexArrayObject
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
+
+from cones import BASE_RATIO
+from instrumentation import tracer
+
+GL_VERSION = (3, 3)  # core profile: geometry shaders and instancing, Mesa's llvmpipe has it without a GPU
+LINE_WIDTH = 2.0  # pixels, like the QPainter canvas' pen
+CONE_ARC_SEGMENTS = 16  # triangles per quarter of a cone's base ellipse
+OUTLINE_COLOR = QColor(Qt.GlobalColor.black)  # sides of the cones
+
+# PySide has the GL functions but not the enums
+GL_FLOAT = 0x1406
+GL_LINES = 0x0001
+GL_LINE_STRIP = 0x0003
+GL_TRIANGLES = 0x0004
+GL_SCISSOR_TEST = 0x0C11
+GL_DEPTH_TEST = 0x0B71
+
+CURVE_VERTEX = """
+#version 330 core
+layout(location = 0) in vec2 position;  // relative to the plot's origin
+layout(location = 1) in float valid;    // 0 for samples that aren't finite
+uniform vec2 offset;  // pixel position of the origin
+uniform vec2 unit;    // pixels per logical unit, y negative
+out float v_valid;
+
+void main() {
+    // in pixels, the geometry shader widens segments there and maps them to clip space
+    gl_Position = vec4(offset + position * unit, 0.0, 1.0);
+    v_valid = valid;
+}
+"""
+
+CURVE_GEOMETRY = """
+#version 330 core
+layout(lines) in;
+layout(triangle_strip, max_vertices = 4) out;
+in float v_valid[];
+uniform vec2 viewport;   // widget size in pixels
+uniform float width;
+uniform float max_jump;  // segments rising more pixels than this are poles and left out
+
+vec4 clip(vec2 p) {
+    return vec4(p.x / viewport.x * 2.0 - 1.0, 1.0 - p.y / viewport.y * 2.0, 0.0, 1.0);
+}
+
+void main() {
+    vec2 a = gl_in[0].gl_Position.xy;
+    vec2 b = gl_in[1].gl_Position.xy;
+    if (v_valid[0] < 0.5 || v_valid[1] < 0.5 || abs(b.y - a.y) >= max_jump)
+        return;
+
+    vec2 d = b - a;
+    vec2 n = length(d) > 0.0 ? normalize(vec2(-d.y, d.x)) * width / 2.0 : vec2(0.0, width / 2.0);
+    gl_Position = clip(a + n); EmitVertex();
+    gl_Position = clip(a - n); EmitVertex();
+    gl_Position = clip(b + n); EmitVertex();
+    gl_Position = clip(b - n); EmitVertex();
+    EndPrimitive();
+}
+"""
+
+CONE_VERTEX = """
+#version 330 core
+layout(location = 0) in vec3 corner;  // (u, v, w) of the unit cone, see _cone_mesh
+layout(location = 1) in vec3 tint;
+layout(location = 2) in vec2 cone;    // (x relative to the origin, height), one per instance
+uniform vec2 offset;
+uniform vec2 unit;
+uniform vec2 viewport;
+uniform float half_width;
+uniform float base_ratio;
+uniform float base_height;
+uniform vec4 color;
+out vec4 v_color;
+
+void main() {
+    float base = base_ratio * abs(cone.y) + base_height;
+    vec2 world = vec2(cone.x + half_width * corner.x, cone.y * corner.y - base * corner.z);
+    vec2 p = offset + world * unit;
+    gl_Position = vec4(p.x / viewport.x * 2.0 - 1.0, 1.0 - p.y / viewport.y * 2.0, 0.0, 1.0);
+    v_color = vec4(color.rgb * tint, color.a);
+}
+"""
+
+FILL_FRAGMENT = """
+#version 330 core
+uniform vec4 color;
+out vec4 fragment;
+
+void main() {
+    fragment = color;
+}
+"""
+
+SHADED_FRAGMENT = """
+#version 330 core
+in vec4 v_color;
+out vec4 fragment;
+
+void main() {
+    fragment = v_color;
+}
+"""
+
+
+def surface_format():
+    surface = QSurfaceFormat()
+    surface.setVersion(*GL_VERSION)
+    surface.setProfile(QSurfaceFormat.OpenGLContextProfile.CoreProfile)
+    return surface
+
+
+def opengl_error():
+    # None when a context of GL_VERSION can be made, otherwise what went wrong. On Linux without a GPU
+    # Mesa renders with llvmpipe (LIBGL_ALWAYS_SOFTWARE=1 forces it), under X, Xvfb or Wayland.
+    context = QOpenGLContext()
+    context.setFormat(surface_format())
+    if not context.create():
+        return "can't create an OpenGL context"
+    version = context.format().version()
+    if tuple(version) < GL_VERSION:
+        return f"OpenGL {version[0]}.{version[1]} is too old, {GL_VERSION[0]}.{GL_VERSION[1]} is needed"
+
+    surface = QOffscreenSurface()
+    surface.setFormat(context.format())
+    surface.create()
+    if not context.makeCurrent(surface):
+        return "can't make the OpenGL context current"
+    context.doneCurrent()
+    return None
+
+
+class GLPlotLayer(QOpenGLWidget):
+    # draws the plots of a chart with OpenGL. A plot is uploaded to vertex buffers once, relative to an
+    # origin of its own so float32 keeps the precision of its samples; pan and zoom only change the
+    # offset and unit uniforms of the next frame. Curves are line strips that a geometry shader widens,
+    # leaving out segments at gaps and poles. All cones of a plot are one instanced draw of a unit cone.
+    # What lies under and over the plots (background, grid, labels) is painted by the owner with
+    # QPainter, through paint_under(painter) and paint_over(painter).
+
+    def __init__(self, parent, paint_under, paint_over):
+        super().__init__(parent)
+        self.setFormat(surface_format())
+        # pan and zoom are handled by the owner
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.paint_under = paint_under
+        self.paint_over = paint_over
+        self.view = None  # the chart's ViewState of the next frame, its axis area clips the plots
+
+        self._plots = []  # _Curve and _Cones, oldest first
+        self._stream = None  # _StreamCurve of a live series
+        self._curve_program = None
+        self._cone_program = None
+        self._cone_meshes = None  # (buffer, vertices) of the fill and the outline by rounded, shared by all cone plots
+
+    def set_view(self, view):
+        self.view = view
+        self.update()
+
+    def add_curve(self, xs, ys, color=Qt.GlobalColor.blue, max_jump=None):
+        # a polyline through (xs, ys), broken at samples that aren't finite and, by default, at
+        # vertical jumps taller than the widget
+        self._plots.append(_Curve(xs, ys, color, max_jump))
+        self.update()
+
+    def add_cones(self, xs, heights, color, width=1.0, base_height=None, rounded=False):
+        # cones of the given width standing on y = 0 at xs, `heights` tall. Their base ellipse is
+        # BASE_RATIO of the height tall, or base_height when that is given. Rounded cones are the ones
+        # of chart.PlotCanvas, with its colors tinted by `color`
+        self._plots.append(_Cones(xs, heights, color, width, base_height, rounded))
+        self.update()
+
+    def start_stream(self, capacity):
+        self._release([self._stream])
+        self._stream = _StreamCurve(capacity)
+
+    def reset_stream(self, xs, ys):
+        # replaces the samples of the live series, the oldest first
+        self._stream.reset(xs, ys)
+        self.update()
+
+    def append_stream(self, xs, ys):
+        self._stream.append(xs, ys)
+        self.update()
+
+    def stop_stream(self):
+        self._release([self._stream])
+        self._stream = None
+
+    def clear(self):
+        self._release(self._plots)
+        self._plots = []
+
+    def initializeGL(self):
+        self._curve_program = _program(CURVE_VERTEX, FILL_FRAGMENT, CURVE_GEOMETRY)
+        self._cone_program = _program(CONE_VERTEX, SHADED_FRAGMENT)
+        self._cone_meshes = {rounded: [(_vertex_buffer(mesh), len(mesh)) for mesh in meshes]
+                             for rounded, meshes in ((False, _cone_mesh()), (True, _rounded_cone_mesh()))}
+        self.context().aboutToBeDestroyed.connect(self._destroy)
+
+    def paintGL(self):
+        start = time.perf_counter()
+        painter = QPainter(self)
+        self.paint_under(painter)
+        if self.view is not None:
+            painter.beginNativePainting()
+            self._draw_plots()
+            painter.endNativePainting()
+        self.paint_over(painter)
+        painter.end()
+        tracer.record_frame(start, time.perf_counter() - start)
+
+    def _draw_plots(self):
+        # the extra functions include the basic ones. PySide wraps both as one object, whichever is asked
+        # for first, so functions() isn't used at all or glDrawArraysInstanced would be missing
+        gl = self.context().extraFunctions()
+        plots = self._plots + ([self._stream] if self._stream is not None else [])
+        for plot in plots:
+            if not plot.uploaded:
+                plot.upload(gl, self._curve_program, self._cone_program, self._cone_meshes)
+
+        # clipped to the axis area, in device pixels counted from the bottom
+        area = self.view.axis_area
+        ratio = self.devicePixelRatioF()
+        gl.glDisable(GL_DEPTH_TEST)
+        gl.glEnable(GL_SCISSOR_TEST)
+        gl.glScissor(int(area.left() * ratio), int((self.height() - area.bottom() - 1) * ratio),
+                     int(area.width() * ratio), int(area.height() * ratio))
+        size = (float(self.width()), float(self.height()))
+        for plot in plots:
+            plot.draw(gl, self.view, size)
+        gl.glDisable(GL_SCISSOR_TEST)
+
+    def _release(self, plots):
+        # buffers are freed with the context current; before the first frame nothing was uploaded
+        plots = [plot for plot in plots if plot is not None and plot.uploaded]
+        if not plots or not self.isValid():
+            return
+        self.makeCurrent()
+        for plot in plots:
+            plot.destroy()
+        self.doneCurrent()
+
+    def _destroy(self):
+        self._release(self._plots + [self._stream])
+        self.makeCurrent()
+        for meshes in self._cone_meshes.values():
+            for buffer, _ in meshes:
+                buffer.destroy()
+        self.doneCurrent()
+
+
+class _Curve:
+    # a polyline as a line strip of (x, y, valid) float32 vertices relative to its first finite sample
+
+    def __init__(self, xs, ys, color, max_jump):
+        # a QColor, a Qt.GlobalColor would pick the (location, int) overload of setUniformValue
+        self.color = QColor(color)
+        self.max_jump = max_jump
+        self.origin = _origin(xs, ys)
+        self._vertices = _curve_vertices(xs, ys, self.origin)
+        self._count = len(self._vertices)
+        self._vao = None
+        self._buffer = None
+        self._program = None
+
+    @property
+    def uploaded(self):
+        return self._vao is not None
+
+    def upload(self, gl, curve_program, cone_program, cone_meshes):
+        self._program = curve_program
+        self._vao = QOpenGLVertexArrayObject()
+        self._vao.create()
+        self._vao.bind()
+        self._buffer = _vertex_buffer(self._vertices)
+        _curve_attributes(curve_program)
+        self._vao.release()
+        # the samples are on the GPU now
+        self._vertices = None
+
+    def draw(self, gl, view, size):
+        if self._count < 2:
+            return
+        program = self._program
+        program.bind()
+        _set_view_uniforms(program, view, self.origin, size)
+        program.setUniformValue1f('width', LINE_WIDTH)
+        # a finite stand-in for no limit, inf isn't guaranteed to survive as a uniform
+        program.setUniformValue1f('max_jump', view.height if self.max_jump is None else min(self.max_jump, 3e38))
+        program.setUniformValue(program.uniformLocation('color'), self.color)
+        self._vao.bind()
+        gl.glDrawArrays(GL_LINE_STRIP, 0, self._count)
+        self._vao.release()
+        program.release()
+
+    def destroy(self):
+        self._buffer.destroy()
+        self._vao.destroy()
+        self._vao = None
+
+
+class _StreamCurve(_Curve):
+    # the samples of a live series in a buffer of twice its capacity: sample i is written to slots
+    # i % capacity and i % capacity + capacity, so the newest `capacity` samples are always one
+    # contiguous range that a single line strip draws. New samples are written where they belong,
+    # nothing that is already on the GPU is uploaded again.
+
+    def __init__(self, capacity):
+        super().__init__(np.empty(0), np.empty(0), Qt.GlobalColor.blue, np.inf)
+        self.capacity = capacity
+        self._written = 0  # samples appended so far
+        self._pending = []  # (slot, vertices) still to be written to the buffer
+
+    def reset(self, xs, ys):
+        self._written = 0
+        self._pending.clear()
+        self.append(xs, ys)
+
+    def append(self, xs, ys):
+        if self._written == 0 and not len(self._pending):
+            self.origin = _origin(xs, ys)
+        xs, ys = xs[-self.capacity:], ys[-self.capacity:]
+        vertices = _curve_vertices(xs, ys, self.origin)
+
+        slot = self._written % self.capacity
+        wrap = self.capacity - slot  # samples up to the end of the first copy
+        self._pending.append((slot, vertices))
+        self._pending.append((slot + self.capacity, vertices[:wrap]))
+        if len(vertices) > wrap:
+            self._pending.append((0, vertices[wrap:]))
+        self._written += len(vertices)
+        self._count = min(self._written, self.capacity)
+
+    def upload(self, gl, curve_program, cone_program, cone_meshes):
+        self._program = curve_program
+        self._vao = QOpenGLVertexArrayObject()
+        self._vao.create()
+        self._vao.bind()
+        self._buffer = QOpenGLBuffer(QOpenGLBuffer.Type.VertexBuffer)
+        self._buffer.create()
+        self._buffer.setUsagePattern(QOpenGLBuffer.UsagePattern.DynamicDraw)
+        self._buffer.bind()
+        self._buffer.allocate(2 * self.capacity * _VERTEX_BYTES)
+        _curve_attributes(curve_program)
+        self._vao.release()
+
+    def draw(self, gl, view, size):
+        if self._pending:
+            self._buffer.bind()
+            for slot, vertices in self._pending:
+                self._buffer.write(slot * _VERTEX_BYTES, vertices, vertices.nbytes)
+            self._buffer.release()
+            self._pending.clear()
+        if self._count < 2:
+            return
+
+        first = (self._written - self._count) % self.capacity
+        program = self._program
+        program.bind()
+        _set_view_uniforms(program, view, self.origin, size)
+        program.setUniformValue1f('width', LINE_WIDTH)
+        program.setUniformValue1f('max_jump', 3e38)
+        program.setUniformValue(program.uniformLocation('color'), self.color)
+        self._vao.bind()
+        gl.glDrawArrays(GL_LINE_STRIP, first, self._count)
+        self._vao.release()
+        program.release()
+
+
+class _Cones:
+    # (x, height) float32 instances of the unit cone mesh, x relative to the first cone
+
+    def __init__(self, xs, heights, color, width, base_height, rounded):
+        self.color = QColor(color)
+        self.width = width
+        self.base_height = base_height
+        self.rounded = rounded
+        self.origin = (float(xs[0]) if len(xs) else 0.0, 0.0)
+        self._instances = np.column_stack((xs - self.origin[0], heights)).astype(np.float32)
+        self._count = len(self._instances)
+        self._vaos = None  # (vertex array, mesh vertices) of the fill and the outline
+        self._buffer = None
+        self._program = None
+
+    @property
+    def uploaded(self):
+        return self._vaos is not None
+
+    def upload(self, gl, curve_program, cone_program, cone_meshes):
+        # one vertex array for the filled mesh and one for the outline, both over the same instances
+        self._program = cone_program
+        self._buffer = _vertex_buffer(self._instances)
+        self._vaos = []
+        for mesh, vertices in cone_meshes[self.rounded]:
+            vao = QOpenGLVertexArrayObject()
+            vao.create()
+            vao.bind()
+            mesh.bind()
+            cone_program.enableAttributeArray(0)
+            cone_program.setAttributeBuffer(0, GL_FLOAT, 0, 3, _MESH_VERTEX_BYTES)
+            cone_program.enableAttributeArray(1)
+            cone_program.setAttributeBuffer(1, GL_FLOAT, 3 * 4, 3, _MESH_VERTEX_BYTES)
+            self._buffer.bind()
+            cone_program.enableAttributeArray(2)
+            cone_program.setAttributeBuffer(2, GL_FLOAT, 0, 2, 2 * 4)
+            gl.glVertexAttribDivisor(2, 1)
+            vao.release()
+            self._vaos.append((vao, vertices))
+        self._instances = None
+
+    def draw(self, gl, view, size):
+        if not self._count:
+            return
+        program = self._program
+        program.bind()
+        _set_view_uniforms(program, view, self.origin, size)
+        program.setUniformValue1f('half_width', self.width / 2)
+        program.setUniformValue1f('base_ratio', BASE_RATIO if self.base_height is None else 0.0)
+        program.setUniformValue1f('base_height', self.base_height or 0.0)
+
+        # every cone is filled and then outlined in order, like overlapping cones on the QPainter canvas.
+        # The rounded mesh has its outline color in the tint
+        outline = self.color if self.rounded else OUTLINE_COLOR
+        for (vao, vertices), mode, color in zip(self._vaos, (GL_TRIANGLES, GL_LINES), (self.color, outline)):
+            program.setUniformValue(program.uniformLocation('color'), color)
+            vao.bind()
+            gl.glDrawArraysInstanced(mode, 0, vertices, self._count)
+            vao.release()
+        program.release()
+
+    def destroy(self):
+        self._buffer.destroy()
+        for vao, _ in self._vaos:
+            vao.destroy()
+        self._vaos = None
+
+
+_VERTEX_BYTES = 3 * 4  # (x, y, valid) as float32
+_MESH_VERTEX_BYTES = 6 * 4  # (u, v, w, tint) as float32
+
+
+def _origin(xs, ys):
+    finite = np.flatnonzero(np.isfinite(xs) & np.isfinite(ys))
+    if not len(finite):
+        return 0.0, 0.0
+    return float(xs[finite[0]]), float(ys[finite[0]])
+
+
+def _curve_vertices(xs, ys, origin):
+    xs = np.asarray(xs, dtype=float) - origin[0]
+    ys = np.asarray(ys, dtype=float) - origin[1]
+    valid = np.isfinite(xs) & np.isfinite(ys)
+    vertices = np.zeros((len(xs), 3), dtype=np.float32)
+    vertices[valid, 0] = xs[valid]
+    vertices[valid, 1] = ys[valid]
+    vertices[:, 2] = valid
+    return vertices
+
+
+def _cone_mesh():
+    # float32 (u, v, w, r, g, b) vertices of a cone with its top at height 1 and its base on 0:
+    # x = cone x + u * half width, y = v * height - w * base height, rgb tints the plot's color.
+    # Triangles of the body, the front half of the base ellipse dark on the left and light on the
+    # right, and the shadow over the left half of the body, then the lines of the sides.
+    light, dark = (1.0,) * 3, (1 / 1.5,) * 3  # QColor.darker(150)
+    top, left, right, middle = (0, 1, 0), (-1, 0, 0), (1, 0, 0), (0, 0, 0)
+
+    triangles = [(top, left, right, light)]
+    for first, shade in ((180, dark), (270, light)):
+        triangles += [(middle, a, b, shade) for a, b in _arc(first, first + 90)]
+    triangles.append((top, left, middle, dark))
+
+    fill = [(*corner, *shade) for *corners, shade in triangles for corner in corners]
+    outline = [(*corner, *light) for corner in (top, left, top, right)]
+    return np.array(fill, dtype=np.float32), np.array(outline, dtype=np.float32)
+
+
+def _rounded_cone_mesh():
+    # chart.PlotCanvas' cone in the vertices of _cone_mesh, colors included: the whole base ellipse
+    # shaded from its center to the rim, the halves of the body bulging out along its cubic and the
+    # straight lines of the sides
+    center, rim = _rgb(200, 200, 255), _rgb(120, 120, 160)
+    top, left, right, middle = (0, 1, 0), (-1, 0, 0), (1, 0, 0), (0, 0, 0)
+
+    vertices = []
+    for a, b in _arc(0, 360):
+        vertices += [(*middle, *center), (*a, *rim), (*b, *rim)]
+    for side, color in ((-1, _rgb(150, 180, 250)), (1, _rgb(80, 110, 180))):
+        t = np.linspace(0, 1, 4 * CONE_ARC_SEGMENTS + 1)[:, None]
+        controls = [(0, 1), (0.7 * side, 0.5), (side, 0.2), (side, 0)]
+        curve = ((1 - t) ** 3 * controls[0] + 3 * (1 - t) ** 2 * t * controls[1] + 3 * (1 - t) * t ** 2 * controls[2]
+                 + t ** 3 * controls[3]).tolist()
+        for (u1, v1), (u2, v2) in zip(curve, curve[1:]):
+            vertices += [(*middle, *color), (u1, v1, 0, *color), (u2, v2, 0, *color)]
+
+    outline = [(*corner, *_rgb(50, 50, 80)) for corner in (top, left, top, right)]
+    return np.array(vertices, dtype=np.float32), np.array(outline, dtype=np.float32)
+
+
+def _arc(first, last):
+    # (u, v, w) segments of the base ellipse from angle `first` to `last` in degrees. Qt's angles run
+    # counter-clockwise on screen, w grows downwards
+    angles = np.radians(np.linspace(first, last, round((last - first) / 90 * CONE_ARC_SEGMENTS) + 1))
+    arc = [(math.cos(a), 0, -math.sin(a)) for a in angles.tolist()]
+    return list(zip(arc, arc[1:]))
+
+
+def _rgb(red, green, blue):
+    return red / 255, green / 255, blue / 255
+
+
+def _program(vertex, fragment, geometry=None):
+    program = QOpenGLShaderProgram()
+    program.addShaderFromSourceCode(QOpenGLShader.ShaderTypeBit.Vertex, vertex)
+    if geometry is not None:
+        program.addShaderFromSourceCode(QOpenGLShader.ShaderTypeBit.Geometry, geometry)
+    program.addShaderFromSourceCode(QOpenGLShader.ShaderTypeBit.Fragment, fragment)
+    if not program.link():
+        raise RuntimeError(f"Can't link shaders: {program.log()}")
+    return program
+
+
+def _vertex_buffer(array):
+    # a static buffer with the array's float32 data, left bound
+    buffer = QOpenGLBuffer(QOpenGLBuffer.Type.VertexBuffer)
+    buffer.create()
+    buffer.bind()
+    data = np.ascontiguousarray(array, dtype=np.float32)
+    buffer.allocate(data, data.nbytes)
+    return buffer
+
+
+def _curve_attributes(program):
+    program.enableAttributeArray(0)
+    program.setAttributeBuffer(0, GL_FLOAT, 0, 2, _VERTEX_BYTES)
+    program.enableAttributeArray(1)
+    program.setAttributeBuffer(1, GL_FLOAT, 2 * 4, 1, _VERTEX_BYTES)
+
+
+def _set_view_uniforms(program, view, origin, size):
+    # the pan and zoom of a frame: where the plot's origin is and how many pixels a unit spans,
+    # worked out in float64 so the float32 vertices only hold the offsets from the origin
+    offset_x = view.center_x + origin[0] * view.unit_x
+    offset_y = view.center_y - origin[1] * view.unit_y
+    program.setUniformValue(program.uniformLocation('offset'), float(offset_x), float(offset_y))
+    program.setUniformValue(program.uniformLocation('unit'), float(view.unit_x), float(-view.unit_y))
+    program.setUniformValue(program.uniformLocation('viewport'), *size)
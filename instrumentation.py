@@ -0,0 +1,188 @@
+import builtins
+import functools
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+SPAN_LIMIT = 100000  # recorded spans, the oldest are dropped first
+FRAME_HISTORY = 120  # paint frames kept for fps/frame time statistics
+FPS_WINDOW = 1.0  # seconds of frames the fps is computed over
+
+PROFILE_STARTUP_FLAG = '--profile-startup'  # command line switch printing where startup time went
+PROFILE_TOP = 15  # rows of each table in the startup profile
+
+
+class Tracer:
+    # collects timing spans from the GUI and render threads while enabled, paint frame timings
+    # and counters always. Spans can be written as a Chrome trace (chrome://tracing, Perfetto).
+
+    def __init__(self, max_spans=SPAN_LIMIT, max_frames=FRAME_HISTORY):
+        self.enabled = False
+        self.spans = deque(maxlen=max_spans)
+        self.frames = deque(maxlen=max_frames)
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # deque.append is atomic, spans from render threads need no lock
+            self.spans.append((name, start, time.perf_counter() - start, threading.get_ident(), args))
+
+    def traced(self, name=None):
+        # decorator putting a span around every call of a function
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def record_frame(self, start, duration, kind='paint'):
+        # kind tells frames drawn differently apart, like full draws and blits
+        self.frames.append((start, duration, kind))
+
+    def frame_stats(self) -> dict:
+        # fps over the last FPS_WINDOW seconds of frames and the mean frame time of the same frames,
+        # also per kind as '<kind>_ms'
+        if not self.frames:
+            return {'fps': 0.0, 'frame_ms': 0.0}
+
+        last = self.frames[-1][0]
+        recent = [frame for frame in self.frames if last - frame[0] <= FPS_WINDOW]
+        elapsed = last - recent[0][0]
+        fps = (len(recent) - 1) / elapsed if elapsed > 0 else 0.0
+        stats = {'fps': fps, 'frame_ms': sum(frame[1] for frame in recent) / len(recent) * 1000}
+        for kind in {frame[2] for frame in recent}:
+            durations = [frame[1] for frame in recent if frame[2] == kind]
+            stats[f'{kind}_ms'] = sum(durations) / len(durations) * 1000
+        return stats
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters.clear()
+
+    def clear(self):
+        self.spans.clear()
+        self.frames.clear()
+        self.reset_counters()
+
+    def export_chrome_trace(self, path):
+        # complete ("X") events with microsecond timestamps, one row per thread
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': (start - self._origin) * 1e6, 'dur': duration * 1e6,
+                   'pid': pid, 'tid': tid, 'args': args}
+                  for name, start, duration, tid, args in list(self.spans)]
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': threading.main_thread().ident,
+                       'args': {'name': 'GUI'}})
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return len(events) - 1
+
+
+class ImportProfiler:
+    # times every module loaded by an import statement while installed, like python -X importtime:
+    # `total` includes the modules a module imports itself, `own` doesn't. Marks note when startup
+    # steps finished, all times are from the import of this module, which happens first.
+
+    def __init__(self):
+        self.installed = False
+        self.modules = []  # (name, thread name, own seconds, total seconds) in load order
+        self.marks = []  # (label, seconds)
+        self._origin = time.perf_counter()
+        self._import = builtins.__import__
+        self._local = threading.local()
+
+    def install(self):
+        if not self.installed:
+            self.installed = True
+            builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self.installed:
+            self.installed = False
+            builtins.__import__ = self._import
+
+    def mark(self, label):
+        if self.installed:
+            self.marks.append((label, time.perf_counter() - self._origin))
+
+    def finish(self):
+        # prints the report once and stops timing imports
+        if self.installed:
+            self.uninstall()
+            self.report()
+
+    def report(self):
+        print("Startup, ms since the first import:")
+        for label, elapsed in self.marks:
+            print(f"  {label:<32}{elapsed * 1000:8.0f}")
+
+        packages = defaultdict(lambda: [0.0, 0])
+        for name, thread, own, _ in self.modules:
+            package = packages[(name.partition('.')[0], thread)]
+            package[0] += own
+            package[1] += 1
+        print(f"Import time by package ({len(self.modules)} modules), own ms:")
+        for (package, thread), (own, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:PROFILE_TOP]:
+            print(f"  {package:<24}{thread:<12}{own * 1000:8.1f}  {count} modules")
+
+        print("Slowest imports, total ms / own ms:")
+        for name, thread, own, total in sorted(self.modules, key=lambda module: -module[3])[:PROFILE_TOP]:
+            print(f"  {name:<40}{thread:<12}{total * 1000:8.1f}{own * 1000:8.1f}")
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = _absolute_name(name, globals, level)
+        if module in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        # time spent in nested loads is taken off the own time of the importing module
+        outer = getattr(self._local, 'nested', None)
+        self._local.nested = 0.0
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - start
+            self.modules.append((module, threading.current_thread().name, total - self._local.nested, total))
+            self._local.nested = None if outer is None else outer + total
+
+
+def _absolute_name(name, globals, level):
+    if not level:
+        return name
+    package = (globals or {}).get('__package__')
+    try:
+        return importlib.util.resolve_name('.' * level + name, package)
+    except (ImportError, ValueError):
+        return name
+
+
+tracer = Tracer()
+import_profiler = ImportProfiler()
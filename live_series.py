@@ -0,0 +1,197 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from data_series import DataSeries
+
+RING_CAPACITY = 1 << 20  # samples kept per live series, older ones are overwritten
+READ_SIZE = 1 << 16  # bytes read from a source at a time
+TAIL_POLL = 0.05  # seconds between reads of a followed file that has no new lines
+BLOCK_TIMEOUT = 0.1  # seconds a blocked producer waits before checking whether it was stopped
+
+
+class RingSeries:
+    # fixed capacity ring buffer of (x, y) samples, appended by a producer thread and drawn by the GUI.
+    # Samples are numbered by a running index, without explicit x they are at index * dx. When the
+    # producer outpaces the renderer it either waits for room (block=True) or overwrites samples that
+    # were never drawn, which are counted in `dropped`.
+
+    def __init__(self, capacity=RING_CAPACITY, dx=1.0, block=True, name=''):
+        self.capacity = capacity
+        self.dx = dx
+        self.block = block
+        self.name = name
+
+        self.total = 0  # samples appended so far
+        self.consumed = 0  # running index up to which samples were handed to the renderer
+        self.dropped = 0
+        self.waits = 0
+        self.closed = False
+
+        self._xs = np.empty(capacity)
+        self._ys = np.empty(capacity)
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, ys, xs=None):
+        ys = np.asarray(ys, dtype=float)
+        with self._room:
+            if self.block:
+                while not self.closed and self.total - self.consumed + len(ys) > self.capacity \
+                        and self.total > self.consumed:
+                    self.waits += 1
+                    self._room.wait(BLOCK_TIMEOUT)
+                if self.closed:
+                    return
+
+            if xs is None:
+                xs = (self.total + np.arange(len(ys))) * self.dx
+            xs = np.asarray(xs, dtype=float)
+            if len(ys) > self.capacity:
+                # the samples that don't fit never reach the buffer, they count as taken and dropped once
+                self.dropped += len(ys) - self.capacity
+                self.total += len(ys) - self.capacity
+                self.consumed += len(ys) - self.capacity
+                xs = xs[-self.capacity:]
+                ys = ys[-self.capacity:]
+
+            overflow = self.total - self.consumed + len(ys) - self.capacity
+            if overflow > 0:
+                self.dropped += overflow
+                self.consumed += overflow
+
+            # at most two copies, up to the end of the arrays and the rest from the start
+            start = self.total % self.capacity
+            head = min(len(ys), self.capacity - start)
+            self._xs[start:start + head] = xs[:head]
+            self._ys[start:start + head] = ys[:head]
+            self._xs[:len(ys) - head] = xs[head:]
+            self._ys[:len(ys) - head] = ys[head:]
+            self.total += len(ys)
+
+    def take(self):
+        # (xs, ys) appended since the last take, the renderer calls this once per frame
+        with self._room:
+            xs, ys = self._copy(self.consumed, self.total)
+            self.consumed = self.total
+            self._room.notify_all()
+        return xs, ys
+
+    def snapshot(self):
+        # the buffered samples in order as a DataSeries, marked as drawn
+        with self._room:
+            xs, ys = self._copy(self.total - len(self), self.total)
+            self.consumed = self.total
+            self._room.notify_all()
+        return DataSeries(ys, xs=xs, name=self.name)
+
+    def close(self):
+        with self._room:
+            self.closed = True
+            self._room.notify_all()
+
+    def _copy(self, first, last):
+        indices = np.arange(first, last) % self.capacity
+        return self._xs[indices], self._ys[indices]
+
+
+class StreamReader:
+    # producer thread feeding a RingSeries from a source: a file that is followed as it grows (like
+    # tail -f), '-' for stdin or tcp://host:port. Lines hold y or x,y separated by a comma like csv,
+    # lines that don't parse are skipped and counted in `bad_lines`. Reading ends with the source or
+    # when the series is closed.
+
+    def __init__(self, source, series):
+        self.source = source
+        self.series = series
+        self.bad_lines = 0
+        self._socket = None
+        self._thread = threading.Thread(target=self._run, name=f"stream {source}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.series.close()
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _run(self):
+        rest = b''
+        try:
+            for chunk in self._chunks():
+                lines = (rest + chunk).split(b'\n')
+                rest = lines.pop()
+                self._append(lines)
+            self._append([rest])
+        except (OSError, ValueError) as ex:
+            print(f"Stream {self.source} failed: {ex}")
+
+    def _chunks(self):
+        if self.source.startswith('tcp://'):
+            host, _, port = self.source[len('tcp://'):].rpartition(':')
+            if not host or not port.isdigit() or int(port) > 65535:
+                raise ValueError("expected tcp://host:port")
+            self._socket = socket.create_connection((host, int(port)))
+            with self._socket:
+                while not self.series.closed:
+                    chunk = self._socket.recv(READ_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+        elif self.source == '-':
+            while not self.series.closed:
+                chunk = sys.stdin.buffer.read1(READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            with open(self.source, 'rb') as file:
+                file.seek(0, os.SEEK_END)
+                while not self.series.closed:
+                    chunk = file.read(READ_SIZE)
+                    if chunk:
+                        yield chunk
+                    else:
+                        time.sleep(TAIL_POLL)
+
+    def _append(self, lines):
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return
+
+        try:
+            data = np.loadtxt(lines, delimiter=',', ndmin=2)
+        except ValueError:
+            data = self._parse_lines(lines)
+            if data is None:
+                return
+
+        if data.shape[1] == 1:
+            self.series.append(data[:, 0])
+        else:
+            self.series.append(data[:, 1], xs=data[:, 0])
+
+    def _parse_lines(self, lines):
+        # slow path for a batch with malformed lines, rows take the column count of the first good line
+        rows = []
+        for line in lines:
+            try:
+                row = [float(value) for value in line.split(b',')]
+            except ValueError:
+                row = None
+            if row is None or (rows and len(row) != len(rows[0])):
+                self.bad_lines += 1
+                continue
+            rows.append(row)
+        return np.array(rows) if rows else None
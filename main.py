@@ -1,14 +1,63 @@
 import sys
+from functools import partial
+from typing import TYPE_CHECKING
+
+from instrumentation import PROFILE_STARTUP_FLAG, import_profiler, tracer
+
+# before the imports below, so they show up in the profile
+if PROFILE_STARTUP_FLAG in sys.argv:
+    import_profiler.install()
 
-import matplotlib.pyplot as plt
 import numpy as np
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import QKeySequence, QShortcut
 from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout
-from matplotlib.axes import Axes
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
-from mpl_toolkits.mplot3d import Axes3D
 
+from blitting import BlitManager
 from funcs import func_1, func_2, func_3
 from gui import Ui_MainWindow
+from preload import Preloader
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from mpl_toolkits.mplot3d import Axes3D
+
+
+CONE_BASE_RADIUS = 1
+SHIFT_FOR_START_IN_0 = 1
+
+# Cone's base antialiasing
+CONE_PRECISE = 10
+
+INTERACTIVE = True  # blit what changed over a cached background and coalesce full redraws, Ctrl+I toggles
+
+
+def _unit_cone_quads(precise):
+    # Quads of the surface plot_surface makes for a cone of height and base radius 1 over the origin,
+    # from a polar meshgrid of precise radii and angles: ((precise - 1) ** 2, 4 corners, xyz)
+    r_matrix, theta_matrix = np.meshgrid(np.linspace(0, 1, precise), np.linspace(0, 2 * np.pi, precise))
+    grid = np.stack((r_matrix * np.cos(theta_matrix), r_matrix * np.sin(theta_matrix), 1 - r_matrix), axis=-1)
+    corners = (grid[:-1, :-1], grid[:-1, 1:], grid[1:, 1:], grid[1:, :-1])
+    return np.stack(corners, axis=2).reshape(-1, 4, 3)
+
+
+UNIT_CONE_QUADS = _unit_cone_quads(CONE_PRECISE)
+
+
+def _cone_quads(cone_heights, steps):
+    # Unit cone scaled to each height and shifted to its place: (cones, quads, 4, 3)
+    scale = np.stack((np.full(len(steps), CONE_BASE_RADIUS), np.full(len(steps), CONE_BASE_RADIUS),
+                      cone_heights), axis=-1)
+    shift = np.stack((SHIFT_FOR_START_IN_0 + CONE_BASE_RADIUS * steps, np.zeros(len(steps)),
+                      np.zeros(len(steps))), axis=-1)
+    return UNIT_CONE_QUADS * scale[:, None, None, :] + shift[:, None, None, :]
+
+
+def _import_matplotlib():
+    # what the figure needs, imported on the preload thread while the window is already up
+    import matplotlib.backends.backend_qtagg
+    import matplotlib.figure
+    import mpl_toolkits.mplot3d
 
 
 class MainWindow(QMainWindow):
@@ -24,8 +73,43 @@ class MainWindow(QMainWindow):
         self.resize(int(QApplication.primaryScreen().geometry().width() * 0.7),
                     int(QApplication.primaryScreen().geometry().height() * 0.7))
 
+        # The chart is created once matplotlib is loaded, see start_preload
+        self.figure = None
+        self._blit = None
+        self._interactive = INTERACTIVE
+        self._preload = Preloader([_import_matplotlib], self)
+        self._preload.finished.connect(self._on_preloaded)
+
+        start = 0
+        end = 10
+        step = 2
+
+        # connected first, a press before the preload finished waits for it
+        self.gui.plot_btn.pressed.connect(self._create_figure)
+        self.gui.plot_btn.pressed.connect(lambda: self.plot_series(func_1, start, end, step))
+        self.gui.plot_btn.pressed.connect(lambda: self.plot_func(self.plot_area_2, func_1, start, end, step))
+
+        QShortcut(QKeySequence("Ctrl+I"), self, self.toggle_interactive)
+
+    def start_preload(self):
+        self._preload.start()
+
+    def _on_preloaded(self):
+        self._create_figure()
+        import_profiler.mark('figure created')
+        import_profiler.finish()
+
+    def _create_figure(self):
+        if self.figure is not None:
+            return
+        self._preload.wait()
+
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+        from matplotlib.figure import Figure
+        import mpl_toolkits.mplot3d  # registers the 3d projection
+
         # Creation of 3D chart widget
-        self.figure = plt.figure()
+        self.figure = Figure()
         self.plot_area_1 = self.figure.add_subplot(121, projection="3d")
         self.plot_area_2 = self.figure.add_subplot(122)
 
@@ -37,61 +121,73 @@ class MainWindow(QMainWindow):
         plot_layout.addWidget(self.figure_canvas)
         self.gui.plot_wdgt.setLayout(plot_layout)
 
-        start = 0
-        end = 10
-        step = 2
-
-        self.gui.plot_btn.pressed.connect(lambda: self.plot_series(func_1, start, end, step))
-        self.gui.plot_btn.pressed.connect(lambda: self.plot_func(self.plot_area_2, func_1, start, end, step))
+        # Frame timing and blitting, a dragged 3D axes is redrawn alone over the rest of the figure
+        self._blit = BlitManager(self.figure_canvas, on_frame=self._show_frame_time)
+        self.figure_canvas.mpl_connect('button_press_event', self._on_press)
+        self.figure_canvas.mpl_connect('button_release_event', self._on_release)
+
+    def toggle_interactive(self):
+        self._interactive = not self._interactive
+        if not self._interactive and self._blit is not None:
+            for artist in list(self._blit.artists):
+                self._blit.remove_artist(artist)
+            self.figure_canvas.draw_idle()
+        self.statusBar().showMessage(f"Interactive redraw {'on' if self._interactive else 'off'}")
+
+    def _on_press(self, event):
+        if self._interactive and event.inaxes is self.plot_area_1 and not self._blit.artists:
+            self._blit.add_artist(self.plot_area_1)
+            self._blit.invalidate()
+
+    def _on_release(self, event):
+        if self.plot_area_1 in self._blit.artists:
+            self._blit.remove_artist(self.plot_area_1)
+            self._blit.invalidate()
+
+    def _show_frame_time(self, blit):
+        _, seconds, kind = tracer.frames[-1]
+        stats = tracer.frame_stats()
+        self.statusBar().showMessage(f"{'Full draw' if kind == 'full' else 'Blit'} {seconds * 1000:.1f} ms, "
+                                     f"last second: full {stats.get('full_ms', 0.0):.1f} ms, "
+                                     f"blit {stats.get('blit_ms', 0.0):.1f} ms, {stats['fps']:.1f} fps")
+
+    def _redraw(self):
+        # One full draw per event loop pass in interactive mode, however many plots asked for it
+        if self._interactive:
+            self._blit.invalidate()
+        else:
+            self.figure_canvas.draw()
 
     def plot_series(self, func, start, end, step):
         num_steps = int((end - start) / step)
-        for i in range(num_steps):
-            self.plot_cone(self.plot_area_1, func(start), "blue", 1, step_num=i)
-            start += step
-
-    def plot_cone(self, plot_area: Axes3D, cone_height: float, color: str, density: float, step_num: int = 0):
-        CONE_BASE_RADIUS = 1
-        SHIFT_FOR_START_IN_0 = 1
-
-        # Cone's base antialiasing
-        PRECISE = 10
-
-        # Center shift for each cone in diagram
-        X_SHIFT = CONE_BASE_RADIUS * step_num
-
-        # Polar coord creation
-        radius_list = np.linspace(0, CONE_BASE_RADIUS, PRECISE)
-        theta_in_radians_list = np.linspace(0, 2 * np.pi, PRECISE)
-
-        # Polar coord meshgrid (2 matrix for all combs of theta and r)
-        r_matrix, theta_matrix = np.meshgrid(radius_list, theta_in_radians_list)
-
-        x_coord_list = r_matrix * np.cos(theta_matrix) + SHIFT_FOR_START_IN_0 + X_SHIFT
-        y_coord_list = r_matrix * np.sin(theta_matrix)
-
-        z_coord_list = cone_height - (cone_height / CONE_BASE_RADIUS) * r_matrix
-
-        # Plot a surface from all matrices
-        plot_area.plot_surface(x_coord_list, y_coord_list, z_coord_list, color=color, alpha=density)
-
-        # # Compute the z-limits based on actual data, not just cone_height
-        # z_min = np.min(z_coord_list)
-        z_max = np.max(z_coord_list)
-        #
-        # # Ensure z-limits are not the same, prevent singular transformation
-        # if z_min == z_max:
-        #     z_max += 1  # Slightly adjust z_max to avoid identical values
-        #
-        # # Set the limits to the same for all axes
-        # max_val = max(np.max(x_coord_list), np.max(y_coord_list), z_max)
-        max_val = np.max(x_coord_list)
-        if np.any(x_coord_list < 0):
+        cone_heights = func(start + step * np.arange(num_steps))
+        self.plot_cones(self.plot_area_1, cone_heights, "blue", 1)
+
+    def plot_cone(self, plot_area: 'Axes3D', cone_height: float, color: str, density: float, step_num: int = 0):
+        self.plot_cones(plot_area, [cone_height], color, density, first_step=step_num)
+
+    def plot_cones(self, plot_area: 'Axes3D', cone_heights, color: str, density: float, first_step: int = 0):
+        from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+        # Cone i stands at step first_step + i, cones of infinite or nan height are left out
+        cone_heights = np.asarray(cone_heights, dtype=float)
+        steps = first_step + np.arange(len(cone_heights))
+        finite = np.isfinite(cone_heights)
+        cone_heights = cone_heights[finite]
+        steps = steps[finite]
+
+        quads = _cone_quads(cone_heights, steps)
+
+        # One collection for all cones, shaded like plot_surface
+        plot_area.add_collection3d(Poly3DCollection(quads.reshape(-1, 4, 3), facecolors=color, alpha=density,
+                                                    shade=True))
+
+        max_val = np.max(quads[..., 0], initial=SHIFT_FOR_START_IN_0 + CONE_BASE_RADIUS)
+        if np.any(quads[..., 0] < 0):
             min_x_limit = -max_val
         else:
             min_x_limit = 0
 
-        #
         plot_area.set_xlim(min_x_limit, max_val)
         plot_area.set_ylim(-max_val, max_val)
         plot_area.set_zlim(-max_val, max_val)
@@ -102,21 +198,33 @@ class MainWindow(QMainWindow):
 
         plot_area.view_init(elev=10, azim=95)  # elev is elevation angle, azim is azimuth angle
 
-        self.figure_canvas.draw()
+        self._redraw()
 
-    def plot_func(self, plot_area: Axes, func, start, end, step):
+    def plot_func(self, plot_area: 'Axes', func, start, end, step):
         x_list = np.arange(start, end, step)
         y_list = func(x_list)
 
+        axes_before = plot_area.get_xlim(), plot_area.get_ylim(), plot_area.get_xlabel(), plot_area.get_ylabel()
         plot_area.set_xlabel('x')
         plot_area.set_ylabel('y')
-        plot_area.plot(x_list, y_list)
+        line, = plot_area.plot(x_list, y_list)
 
-        self.figure_canvas.draw()
+        # A line that leaves limits and labels as they were is drawn over the last frame
+        axes_after = plot_area.get_xlim(), plot_area.get_ylim(), plot_area.get_xlabel(), plot_area.get_ylabel()
+        if self._interactive and axes_after == axes_before:
+            self._blit.draw_static(line)
+        else:
+            self._redraw()
 
 
-app = QApplication(sys.argv)
-window = MainWindow()
+if __name__ == "__main__":
+    import_profiler.mark('imports')
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    import_profiler.mark('window created')
 
-window.show()
-sys.exit(app.exec())
+    window.show()
+    import_profiler.mark('window shown')
+    window.start_preload()
+    QTimer.singleShot(0, partial(import_profiler.mark, 'first events processed'))
+    sys.exit(app.exec())
@@ -3,7 +3,7 @@ from gui import Ui_MainWindow
 import sys
 import math
 
-from chart import PlotCanvas
+from chart import GLPlotCanvas, PlotCanvas, create_canvas
 
 
 class MainApp(QMainWindow):
@@ -12,7 +12,7 @@ class MainApp(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        self.plot = PlotCanvas(self.ui.plot_wdgt)
+        self.plot = create_canvas(PlotCanvas, GLPlotCanvas, self.ui.plot_wdgt)
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.plot)
@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+
+import numpy as np
+
+from expr_cache import ExpressionCache
+from sampling import scalar_evaluator
+
+PROBE_SAMPLES = 32  # samples timed to estimate the cost of an evaluation
+PARALLEL_MIN_COST = 0.15  # seconds, estimated serial cost above which chunks go to worker processes
+MIN_CHUNK_SAMPLES = 256
+CHUNKS_PER_WORKER = 4
+
+_executor = None
+_executor_lock = threading.Lock()  # render workers may start or stop the pool at the same time
+_worker_cache = None
+
+
+class ParallelEvaluator:
+    # evaluates an expression over an array of x, serially when that is cheap and otherwise
+    # split into chunks across worker processes. Workers get the expression text and compile it
+    # themselves, lambdified functions can't be pickled.
+
+    def __init__(self, text, backend, evaluate, max_workers=None):
+        # evaluate(xs) is the in-process evaluator of the same expression and backend
+        self.text = text
+        self.backend = backend
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) - 1)
+        self._evaluate = evaluate
+        self._sample_cost = None
+
+        self.parallel_calls = 0
+        self.serial_calls = 0
+
+    def __call__(self, xs):
+        xs = np.asarray(xs, dtype=float)
+        if self.max_workers < 2 or len(xs) <= PROBE_SAMPLES + MIN_CHUNK_SAMPLES:
+            self.serial_calls += 1
+            return _as_array(self._evaluate(xs), xs)
+
+        probe = None
+        if self._sample_cost is None:
+            started = time.perf_counter()
+            probe = _as_array(self._evaluate(xs[:PROBE_SAMPLES]), xs[:PROBE_SAMPLES])
+            self._sample_cost = (time.perf_counter() - started) / PROBE_SAMPLES
+
+        rest = xs[PROBE_SAMPLES:] if probe is not None else xs
+        if self._sample_cost * len(rest) < PARALLEL_MIN_COST:
+            self.serial_calls += 1
+            ys = _as_array(self._evaluate(rest), rest)
+        else:
+            try:
+                ys = self._evaluate_parallel(rest)
+                self.parallel_calls += 1
+            except BrokenExecutor as ex:
+                print(f"Worker processes failed, evaluating in process: {ex}")
+                shutdown()
+                self.serial_calls += 1
+                ys = _as_array(self._evaluate(rest), rest)
+
+        return ys if probe is None else np.concatenate((probe, ys))
+
+    def _evaluate_parallel(self, xs):
+        num_chunks = min(self.max_workers * CHUNKS_PER_WORKER, max(1, len(xs) // MIN_CHUNK_SAMPLES))
+        chunks = np.array_split(xs, num_chunks)
+        executor = _get_executor(self.max_workers)
+        # map keeps the chunk order, so results are merged by plain concatenation
+        return np.concatenate(list(executor.map(_evaluate_chunk, [self.text] * len(chunks),
+                                                [self.backend] * len(chunks), chunks)))
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _get_executor(max_workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn instead of fork, the GUI process has Qt threads running
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker)
+        return _executor
+
+
+def _init_worker():
+    global _worker_cache
+    _worker_cache = ExpressionCache()
+
+
+def _evaluate_chunk(text, backend, xs):
+    func = _worker_cache.get(text, backend)
+    if backend == 'numpy':
+        with np.errstate(all='ignore'):
+            return _as_array(func(xs), xs)
+    return scalar_evaluator(func)(xs)
+
+
+def _as_array(ys, xs):
+    return np.broadcast_to(np.asarray(ys, dtype=float), xs.shape)
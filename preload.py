@@ -0,0 +1,45 @@
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal
+
+from instrumentation import tracer
+
+
+class Preloader(QObject):
+    # runs warm-up tasks (heavy imports, a first parse) on a daemon thread once the window is up.
+    # finished is delivered on the owner's thread, wait() blocks only while the tasks still run
+    finished = Signal()
+
+    def __init__(self, tasks, parent=None):
+        super().__init__(parent)
+        self.tasks = list(tasks)
+        self.elapsed = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='preload', daemon=True)
+
+    def start(self):
+        if self._thread.ident is None:
+            self._thread.start()
+
+    def is_done(self):
+        return self._done.is_set()
+
+    def wait(self):
+        # without start() there's nothing to wait for, callers import what they need themselves
+        if self._thread.ident is None or self._done.is_set():
+            return
+        with tracer.span('preload wait'):
+            self._done.wait()
+
+    def _run(self):
+        started = time.perf_counter()
+        for task in self.tasks:
+            try:
+                with tracer.span(f'preload {task.__name__}'):
+                    task()
+            except Exception as ex:
+                print(f"Preload {task.__name__} failed: {ex}")
+        self.elapsed = time.perf_counter() - started
+        self._done.set()
+        self.finished.emit()
@@ -0,0 +1,15 @@
+import numpy as np
+import shiboken6
+from PySide6.QtGui import QPolygonF
+
+
+def to_qpolygonf(xs, ys) -> QPolygonF:
+    # fills QPolygonF storage straight from numpy instead of creating a QPointF per sample
+    num = len(xs)
+    polygon = QPolygonF()
+    polygon.resize(num)
+    if num:
+        buffer = np.frombuffer(shiboken6.VoidPtr(polygon.data(), num * 16, True), dtype=np.float64)
+        buffer[0::2] = xs
+        buffer[1::2] = ys
+    return polygon
@@ -0,0 +1,99 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QSize, Signal
+from PySide6.QtGui import QImage, QPainter, QColor
+
+
+class _RenderJob(QRunnable):
+    def __init__(self, renderer, key, generation, size, fill, render):
+        super().__init__()
+        self._renderer = renderer
+        self._key = key
+        self._generation = generation
+        self._size = size
+        self._fill = fill
+        self._render = render
+
+    def run(self):
+        # a newer request may have replaced this one while it was queued
+        if self._generation != self._renderer.generation:
+            return
+
+        image = QImage(self._size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(self._fill)
+        painter = QPainter(image)
+        try:
+            self._render(painter)
+        except Exception as ex:
+            print(f"Render job {self._key} failed: {ex}")
+            return
+        finally:
+            painter.end()
+
+        self._renderer.finished.emit(self._key, self._generation, image)
+
+
+class Renderer(QObject):
+    # paints offscreen QImages on a thread pool; finished is delivered on the owner's thread.
+    # cancel() drops everything still queued and bumps the generation so running jobs are ignored
+    finished = Signal(object, int, QImage)
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.generation = 0
+        self._pool = QThreadPool(self)
+        if max_threads is None:
+            max_threads = max(1, QThreadPool.globalInstance().maxThreadCount() - 1)
+        self._pool.setMaxThreadCount(max_threads)
+
+    def submit(self, key, size: QSize, render, fill=QColor(0, 0, 0, 0)):
+        # render(painter) draws into a fresh image of `size` filled with `fill`
+        self._pool.start(_RenderJob(self, key, self.generation, size, fill, render))
+
+    def cancel(self):
+        self.generation += 1
+        self._pool.clear()
+
+    def wait(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
+
+
+class _CallJob(QRunnable):
+    def __init__(self, evaluator, key, generation, call):
+        super().__init__()
+        self._evaluator = evaluator
+        self._key = key
+        self._generation = generation
+        self._call = call
+
+    def run(self):
+        if self._generation != self._evaluator.generation:
+            return
+
+        try:
+            result = self._call()
+        except Exception as ex:
+            print(f"Evaluation {self._key} failed: {ex}")
+            return
+
+        self._evaluator.finished.emit(self._key, self._generation, result)
+
+
+class Evaluator(QObject):
+    # runs calls on one background thread in the order they were submitted, finished delivers their
+    # results on the owner's thread. cancel() works like Renderer's
+    finished = Signal(object, int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+    def submit(self, key, call):
+        self._pool.start(_CallJob(self, key, self.generation, call))
+
+    def cancel(self):
+        self.generation += 1
+        self._pool.clear()
+
+    def wait(self, msecs=-1):
+        return self._pool.waitForDone(msecs)
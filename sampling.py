@@ -0,0 +1,173 @@
+import math
+import threading
+
+import numpy as np
+
+SAMPLES_PER_COLUMN = 2  # base grid density, samples per pixel column
+MAX_SAMPLES_PER_COLUMN = 32  # hard cap after refinement
+MAX_REFINE_DEPTH = 12
+PIXEL_TOLERANCE = 0.5  # max distance in pixels between a chord and the curve
+MAX_CACHED_SAMPLES = 4 * 1024 * 1024  # per SampleCache, it starts over when it grows past this
+
+
+def step_grid(x_start, x_end, step, view_left, view_right):
+    # indices k of the samples x_start + k * step that cover [view_left, view_right],
+    # including one sample outside on each side so lines reach the viewport border
+    if step <= 0 or x_end < x_start or view_right < x_start or view_left > x_end:
+        return 0, -1
+    k_max = int(math.floor((x_end - x_start) / step + 1e-9))
+    k_first = max(0, int(math.floor((view_left - x_start) / step)))
+    k_last = min(k_max, int(math.ceil((view_right - x_start) / step)))
+    return k_first, k_last
+
+
+def adaptive_sample(func, x_start, x_end, step, view_left, view_right, columns, y_scale):
+    # func maps an array of x to an array of y, y_scale is pixels per logical y unit.
+    # The user step is the finest resolution: the base grid is coarser only when the step
+    # would put more than SAMPLES_PER_COLUMN samples in a pixel column, and refinement
+    # halves intervals only where the curve bends away from the chord or has a gap.
+    # All samples lie on x_start + k * step with the base grid taking every stride-th k for a power
+    # of two stride, so views that overlap or differ in zoom evaluate mostly the same points.
+    k_first, k_last = step_grid(x_start, x_end, step, view_left, view_right)
+    num = k_last - k_first + 1
+    if num <= 0:
+        return np.empty(0), np.empty(0)
+
+    columns = max(1, int(columns))
+    stride = 1
+    while num > (columns * SAMPLES_PER_COLUMN + 1) * stride:
+        stride *= 2
+    k_max = int(math.floor((x_end - x_start) / step + 1e-9))
+    ks = np.minimum(np.arange(k_first // stride * stride, k_last + stride, stride), k_max)
+    xs = x_start + ks * step
+    ys = _evaluate(func, xs)
+
+    budget = columns * MAX_SAMPLES_PER_COLUMN
+    active = np.ones(len(xs) - 1, dtype=bool)
+    for _ in range(MAX_REFINE_DEPTH):
+        dk = np.diff(ks)
+        active &= dk >= 2
+        idx = np.flatnonzero(active)
+        if not len(idx) or len(xs) + len(idx) > budget:
+            break
+
+        km = ks[idx] + dk[idx] // 2
+        xm = x_start + km * step
+        ym = _evaluate(func, xm)
+        y0 = ys[idx]
+        y1 = ys[idx + 1]
+
+        fin0 = np.isfinite(y0)
+        fin1 = np.isfinite(y1)
+        finm = np.isfinite(ym)
+        with np.errstate(invalid='ignore', over='ignore'):
+            error = np.abs(ym - (y0 + y1) / 2) * y_scale
+        # a finiteness change inside the interval is a gap or a pole, keep locating it
+        split = np.where(fin0 & fin1 & finm, error > PIXEL_TOLERANCE, (fin0 | fin1) & ((fin0 != fin1) | (fin0 != finm)))
+
+        idx = idx[split]
+        if not len(idx):
+            break
+
+        ks = np.insert(ks, idx + 1, km[split])
+        xs = np.insert(xs, idx + 1, xm[split])
+        ys = np.insert(ys, idx + 1, ym[split])
+
+        # both halves of a split interval stay active, everything else has converged
+        active = np.zeros(len(xs) - 1, dtype=bool)
+        first_half = idx + np.arange(len(idx))
+        active[first_half] = True
+        active[first_half + 1] = True
+
+    return xs, ys
+
+
+def strided_grid(x_start, x_end, step, view_left, view_right, min_spacing):
+    # samples x_start + k * step inside the view, thinned to every n-th one so they are at least
+    # min_spacing apart; the stride is aligned to k so samples don't jump around on pan/zoom
+    k_first, k_last = step_grid(x_start, x_end, step, view_left, view_right)
+    if k_last < k_first:
+        return np.empty(0)
+
+    stride = max(1, int(math.ceil(min_spacing / step - 1e-9)))
+    k_first = int(math.ceil(k_first / stride)) * stride
+    return x_start + np.arange(k_first, k_last + 1, stride) * step
+
+
+def scalar_evaluator(func):
+    # wraps a math-module function so it can be sampled like a numpy one, failed samples become nan
+    def evaluate(xs):
+        ys = np.empty(len(xs))
+        for i, x in enumerate(xs.tolist()):
+            try:
+                ys[i] = func(x)
+            except (ZeroDivisionError, ValueError, OverflowError):
+                ys[i] = np.nan
+            except Exception as ex:
+                print(f"Error at x={x}: {ex}")
+                ys[i] = np.nan
+        return ys
+
+    return evaluate
+
+
+class SampleCache:
+    # remembers the values of func on the grid x_start + k * step, so pan, zoom and resize evaluate
+    # only the grid points no earlier view has asked for. Called like func; render threads share it.
+
+    def __init__(self, func, x_start, step):
+        self.func = func
+        self.x_start = x_start
+        self.step = step
+
+        self.hits = 0
+        self.misses = 0
+        self.failed = False  # func turned out not to take arrays, the plot is sampled with its fallback
+
+        self._ks = np.empty(0, dtype=np.int64)
+        self._ys = np.empty(0)
+        self._lock = threading.Lock()
+
+    def __call__(self, xs):
+        xs = np.asarray(xs, dtype=float)
+        ks = np.rint((xs - self.x_start) / self.step).astype(np.int64)
+        ys = np.empty(len(xs))
+
+        with self._lock:
+            cached_ks, cached_ys = self._ks, self._ys
+        pos = np.minimum(np.searchsorted(cached_ks, ks), max(len(cached_ks) - 1, 0))
+        hit = cached_ks[pos] == ks if len(cached_ks) else np.zeros(len(ks), dtype=bool)
+        ys[hit] = cached_ys[pos[hit]]
+
+        missing = ~hit
+        if missing.any():
+            # evaluated outside the lock, two threads may occasionally compute the same points
+            new_ks = ks[missing]
+            ys[missing] = _evaluate(self.func, xs[missing])
+            self._merge(new_ks, ys[missing])
+
+        self.hits += int(np.count_nonzero(hit))
+        self.misses += len(ks) - int(np.count_nonzero(hit))
+        return ys
+
+    def mark_failed(self):
+        # True for the first of the threads that find func failing, so the failure is reported once
+        with self._lock:
+            first = not self.failed
+            self.failed = True
+        return first
+
+    def _merge(self, ks, ys):
+        with self._lock:
+            if len(self._ks) + len(ks) > MAX_CACHED_SAMPLES:
+                all_ks, all_ys = ks, ys
+            else:
+                all_ks = np.concatenate((self._ks, ks))
+                all_ys = np.concatenate((self._ys, ys))
+            all_ks, first = np.unique(all_ks, return_index=True)
+            self._ks, self._ys = all_ks, all_ys[first]
+
+
+def _evaluate(func, xs):
+    with np.errstate(all='ignore'):
+        return np.broadcast_to(np.asarray(func(xs), dtype=float), xs.shape).copy()
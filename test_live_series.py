@@ -0,0 +1,47 @@
+import numpy as np
+
+from live_series import RingSeries, StreamReader
+
+
+def test_oversized_batch_is_dropped_once():
+    series = RingSeries(capacity=10, block=False)
+    series.append(np.arange(25.0))
+    assert (series.total, series.dropped, len(series)) == (25, 15, 10)
+
+    xs, ys = series.take()
+    assert ys.tolist() == list(range(15, 25))
+    assert xs.tolist() == list(range(15, 25))
+
+
+def test_oversized_batch_drops_untaken_samples():
+    series = RingSeries(capacity=10, block=False)
+    series.append(np.arange(4.0))
+    series.append(np.arange(4.0, 29.0))
+    assert (series.total, series.dropped) == (29, 19)
+    assert series.take()[1].tolist() == list(range(19, 29))
+
+
+def test_overwritten_samples_are_dropped():
+    series = RingSeries(capacity=10, block=False)
+    series.append(np.arange(6.0))
+    series.take()
+    series.append(np.arange(6.0, 14.0))
+    assert series.dropped == 0
+
+    series.append(np.arange(14.0, 20.0))
+    assert (series.total, series.dropped) == (20, 4)
+    assert series.take()[1].tolist() == list(range(10, 20))
+
+
+def test_snapshot_marks_samples_taken():
+    series = RingSeries(capacity=10, block=False)
+    series.append(np.arange(12.0))
+    snapshot = series.snapshot()
+    assert np.asarray(snapshot.ys).tolist() == list(range(2, 12))
+    assert not len(series.take()[0])
+
+
+def test_malformed_tcp_source_is_reported(capsys):
+    for source in ['tcp://host', 'tcp://host:abc', 'tcp://:80', 'tcp://host:70000']:
+        StreamReader(source, RingSeries(capacity=10))._run()
+        assert f"Stream {source} failed: expected tcp://host:port" in capsys.readouterr().out
@@ -0,0 +1,46 @@
+import math
+from collections import OrderedDict
+
+TILE_SIZE = 256  # tile edge in pixels
+TILE_CACHE_BYTES = 96 * 1024 * 1024
+
+
+class TileCache:
+    # LRU of rendered tile pixmaps keyed by (zoom level, tile x, tile y), bounded by memory
+
+    def __init__(self, max_bytes=TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self._tiles = OrderedDict()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        if key in self._tiles:
+            self.bytes_used -= _pixmap_bytes(self._tiles.pop(key))
+
+        self._tiles[key] = tile
+        self.bytes_used += _pixmap_bytes(tile)
+        while self.bytes_used > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.bytes_used -= _pixmap_bytes(evicted)
+
+    def clear(self):
+        self._tiles.clear()
+        self.bytes_used = 0
+
+
+def tile_range(origin, low, high, size=TILE_SIZE):
+    # indices of the tiles anchored at `origin` that cover the pixel span [low, high]
+    return range(math.floor((low - origin) / size), math.floor((high - origin) / size) + 1)
+
+
+def _pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
@@ -0,0 +1,133 @@
+import os
+import re
+
+from PySide6.QtCore import QBuffer, QMarginsF, QPointF, QRect, QSizeF
+from PySide6.QtGui import QBrush, QColor, QPageSize, QPainter, QPainterPath, QPdfWriter, QPen, QPolygonF, Qt
+from PySide6.QtSvg import QSvgGenerator
+
+from cones import BASE_RATIO, cones_overlap, draw_cone_geometry
+
+CONE_MARKER = '@cones-{}@'  # text painted where a batch of cones goes, replaced by <use> references
+CONE_MARKER_RE = re.compile(r'<text[^>]*>@cones-(\d+)@</text>')
+
+
+def export_vector(path, size, paint):
+    # writes what paint(painter) draws in widget pixels of `size` as .svg or .pdf, by extension
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.svg':
+        document = SvgDocument(size)
+        _paint(document, paint)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(document.svg())
+    elif ext == '.pdf':
+        document = PdfDocument(path, size)
+        _paint(document, paint)
+    else:
+        raise ValueError(f"can't export {ext or 'files without extension'}, use .svg or .pdf")
+
+
+def _paint(document, paint):
+    painter = QPainter(document)
+    try:
+        paint(painter)
+    finally:
+        painter.end()
+
+
+class SvgDocument(QSvgGenerator):
+    # svg with clipping, where cones are <use> references instead of four elements each. There is one
+    # cone of unit height per color, width and direction, every <use> moves it to its base center and
+    # stretches it to its height; the base ellipse is BASE_RATIO of the height, like on the canvas.
+
+    def __init__(self, size):
+        super().__init__(QSvgGenerator.SvgVersion.Svg11)
+        self._buffer = QBuffer()
+        self._buffer.open(QBuffer.WriteOnly)
+        self.setOutputDevice(self._buffer)
+        self.setSize(size)
+        self.setViewBox(QRect(0, 0, size.width(), size.height()))
+
+        self.shapes = {}  # (color, left, right, radius_x, pointing down) -> definition index
+        self.uses = []  # <use> elements of every batch of cones, in painting order
+
+    def add_cones(self, painter, color, geometry):
+        # the <use> elements replace a marker in the painter's group, which already has its transform
+        top_x, top_y, left_x, right_x, base_y, radius_x, _ = (values.tolist() for values in geometry)
+        uses = []
+        for top, left, right, rx, x, y in zip(top_y, left_x, right_x, radius_x, top_x, base_y):
+            key = (color.name(), left - x, right - x, rx, top > y)
+            shape = self.shapes.setdefault(key, len(self.shapes))
+            uses.append(f'<use xlink:href="#cone{shape}" transform="translate({x},{y}) scale(1,{abs(top - y)})"/>')
+
+        # a marker keeps the place of the batch in the painting order and inside the clip path
+        painter.save()
+        painter.setPen(Qt.black)
+        painter.drawText(top_x[0], base_y[0], CONE_MARKER.format(len(self.uses)))
+        painter.restore()
+        self.uses.append('\n'.join(uses))
+
+    def svg(self):
+        text = bytes(self._buffer.data()).decode('utf-8')
+        text = CONE_MARKER_RE.sub(lambda match: self.uses[int(match.group(1))], text)
+        definitions = ''.join(_cone_definition(index, *key) for key, index in self.shapes.items())
+        return text.replace('</defs>', definitions + '</defs>', 1)
+
+
+def _cone_definition(index, color, left, right, radius_x, down):
+    # the cone of draw_cones of unit height around its base center: body, left and right quarter of the
+    # base ellipse, shadow. The outline keeps its width however far the cone is stretched.
+    light = QColor(color).name()
+    dark = QColor(color).darker(150).name()
+    height = 1 if down else -1
+    radius_y = f'{BASE_RATIO:g}'
+    return (f'<g id="cone{index}">\n'
+            f'<polygon points="0,{height} {left},0 {right},0" fill="{light}" stroke="#000000" stroke-width="0.5" '
+            f'vector-effect="non-scaling-stroke"/>\n'
+            f'<path d="M0,0 L{-radius_x},0 A{radius_x},{radius_y} 0 0 0 0,{radius_y} Z" fill="{dark}" stroke="none"/>\n'
+            f'<path d="M0,0 L0,{radius_y} A{radius_x},{radius_y} 0 0 0 {radius_x},0 Z" fill="{light}" stroke="none"/>\n'
+            f'<polygon points="0,{height} {left},0 0,0" fill="{dark}" stroke="none"/>\n'
+            f'</g>\n')
+
+
+class PdfDocument(QPdfWriter):
+    # pdf page of the widget size at one point per pixel, cones that don't overlap are merged into
+    # three paths (outlined bodies, dark and light parts) instead of four primitives each
+
+    def __init__(self, path, size):
+        super().__init__(path)
+        self.setResolution(72)
+        self.setPageSize(QPageSize(QSizeF(size.width(), size.height()), QPageSize.Unit.Point))
+        self.setPageMargins(QMarginsF(0, 0, 0, 0))
+
+    def add_cones(self, painter, color, geometry):
+        if cones_overlap(geometry):
+            draw_cone_geometry(painter, color, geometry)
+            return
+
+        body = QPainterPath()
+        dark = QPainterPath()
+        light = QPainterPath()
+        for top_x, top_y, left_x, right_x, base_y, radius_x, radius_y in zip(*(values.tolist() for values in geometry)):
+            top = QPointF(top_x, top_y)
+            base = QPointF(top_x, base_y)
+            body.addPolygon(QPolygonF([top, QPointF(left_x, base_y), QPointF(right_x, base_y), top]))
+            dark.addPolygon(QPolygonF([top, QPointF(left_x, base_y), base, top]))
+
+            ellipse = QRect(top_x - radius_x, base_y - radius_y, 2 * radius_x, 2 * radius_y)
+            dark.moveTo(base)
+            dark.arcTo(ellipse, 180, 90)
+            dark.closeSubpath()
+            light.moveTo(base)
+            light.arcTo(ellipse, 270, 90)
+            light.closeSubpath()
+
+        painter.save()
+        painter.setPen(QPen(QColor(0, 0, 0), 0.5))
+        painter.setBrush(QBrush(color))
+        painter.drawPath(body)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QBrush(color.darker(150)))
+        painter.drawPath(dark)
+        painter.setBrush(QBrush(color))
+        painter.drawPath(light)
+        painter.restore()
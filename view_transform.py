@@ -0,0 +1,37 @@
+import numpy as np
+from PySide6.QtCore import QRect
+from PySide6.QtGui import QTransform
+
+
+class ViewTransform:
+    # affine map between cartesian (logical) coordinates and widget pixels:
+    # px = center_x + x * unit_x, py = center_y - y * unit_y. The pixels per unit are worked out once,
+    # mapping a point or an array is a multiply and an add per axis. Pixels are truncated like int().
+
+    def __init__(self, axis_area, center_x, center_y, scale, range_x, range_y):
+        self.axis_area = QRect(axis_area)
+        self.center_x = center_x
+        self.center_y = center_y
+        self.scale = scale
+        self.range_x = range_x
+        self.range_y = range_y
+
+        self.unit_x = (self.axis_area.width() / 2) * scale / range_x  # pixels per logical unit
+        self.unit_y = (self.axis_area.height() / 2) * scale / range_y
+        self._inverse_x = 1 / self.unit_x if self.unit_x else 0.0
+        self._inverse_y = 1 / self.unit_y if self.unit_y else 0.0
+
+    def to_pyside_coords(self, x, y):
+        return int(self.center_x + x * self.unit_x), int(self.center_y - y * self.unit_y)
+
+    def to_pyside_coords_array(self, xs, ys):
+        # values stay float to keep nan/inf
+        return np.trunc(self.center_x + xs * self.unit_x), np.trunc(self.center_y - ys * self.unit_y)
+
+    def to_cartesian_coords(self, px, py):
+        # takes numbers or arrays
+        return (px - self.center_x) * self._inverse_x, (self.center_y - py) * self._inverse_y
+
+    def qtransform(self):
+        # the same map for a QPainter or QTransform.map, without the truncation
+        return QTransform(self.unit_x, 0, 0, -self.unit_y, self.center_x, self.center_y)